@@ -0,0 +1,38 @@
+# Dycapo schema upgrades
+# ------------------------------------------------------------
+#
+# syncdb creates missing tables but never alters existing ones. Databases
+# created from an older db/dycapo-mysql.sql.gz, or by an older syncdb, need
+# the statements below for the columns added since. Run the ones of the
+# columns your tables lack, e.g. check with
+#   SHOW COLUMNS FROM `server_search`;
+# then
+#   mysql -u <user> -p dycapo < db/dycapo-mysql-upgrade.sql
+
+
+# Search.proposed_trip: the Trip assigned to a standing search by
+# manage.py matchsearches
+# ------------------------------------------------------------
+
+ALTER TABLE `server_search`
+  ADD COLUMN `proposed_trip_id` int(11) DEFAULT NULL AFTER `destination_id`,
+  ADD KEY `server_search_b485f575` (`proposed_trip_id`);
+
+
+# Location.geohash: the geohash of the GeoRSS point, used to find the
+# Locations inside a box. Fill it for the existing rows afterwards with
+#   python manage.py fillgeohashes
+# ------------------------------------------------------------
+
+ALTER TABLE `server_location`
+  ADD COLUMN `geohash` varchar(12) NOT NULL DEFAULT '' AFTER `georss_point_longitude`,
+  ADD KEY `server_location_81294de1` (`geohash`);
+
+
+# Location.address_pending: set while the address of a Location is being
+# retrieved in the background
+# ------------------------------------------------------------
+
+ALTER TABLE `server_location`
+  ADD COLUMN `address_pending` tinyint(1) NOT NULL DEFAULT 0 AFTER `geohash`,
+  ADD KEY `server_location_b26dd13c` (`address_pending`);
@@ -1,5 +1,5 @@
-from math import atan, tan, sin, cos, pi, sqrt, atan2, acos, asin
-from geopy.units import radians
+import math
+from math import atan, tan, sin, cos, pi, sqrt, atan2, asin
 from geopy import units, util
 from geopy.point import Point
 
@@ -24,7 +24,153 @@ ELLIPSOIDS = {
     'GRS-67':        (6378.1600,   6356.774719,   1 / 298.25)
 }
 
+def great_circle_km(lat1, lng1, lat2, lng2, radius=EARTH_RADIUS):
+    """
+    Return the great-circle distance in kilometers between two points given
+    as latitudes and longitudes in degrees, on a sphere with the given radius
+    in kilometers. Unlike GreatCircleDistance, no object is created.
+    
+    """
+    lat1, lng1 = math.radians(lat1), math.radians(lng1)
+    lat2, lng2 = math.radians(lat2), math.radians(lng2)
+    
+    sin_lat1, cos_lat1 = sin(lat1), cos(lat1)
+    sin_lat2, cos_lat2 = sin(lat2), cos(lat2)
+    
+    delta_lng = lng2 - lng1
+    cos_delta_lng, sin_delta_lng = cos(delta_lng), sin(delta_lng)
+    
+    # From http://en.wikipedia.org/wiki/Great_circle_distance:
+    #   Historically, the use of this formula was simplified by the
+    #   availability of tables for the haversine function. Although this
+    #   formula is accurate for most distances, it too suffers from
+    #   rounding errors for the special (and somewhat unusual) case of
+    #   antipodal points (on opposite ends of the sphere). A more
+    #   complicated formula that is accurate for all distances is: (below)
+    
+    d = atan2(sqrt((cos_lat2 * sin_delta_lng) ** 2 +
+                   (cos_lat1 * sin_lat2 -
+                    sin_lat1 * cos_lat2 * cos_delta_lng) ** 2),
+              sin_lat1 * sin_lat2 + cos_lat1 * cos_lat2 * cos_delta_lng)
+    
+    return radius * d
+
+def vincenty_km(lat1, lng1, lat2, lng2, ellipsoid='WGS-84'):
+    """
+    Return the geodesic distance in kilometers between two points given as
+    latitudes and longitudes in degrees, using Vincenty's formula on the
+    given ellipsoid (a key of ELLIPSOIDS or a (major, minor, flattening)
+    tuple). Unlike VincentyDistance, no object is created.
+    
+    """
+    lat1, lng1 = math.radians(lat1), math.radians(lng1)
+    lat2, lng2 = math.radians(lat2), math.radians(lng2)
+
+    if isinstance(ellipsoid, basestring):
+        major, minor, f = ELLIPSOIDS[ellipsoid]
+    else:
+        major, minor, f = ellipsoid
+
+    delta_lng = lng2 - lng1
+
+    reduced_lat1 = atan((1 - f) * tan(lat1))
+    reduced_lat2 = atan((1 - f) * tan(lat2))
+
+    sin_reduced1, cos_reduced1 = sin(reduced_lat1), cos(reduced_lat1)
+    sin_reduced2, cos_reduced2 = sin(reduced_lat2), cos(reduced_lat2)
+
+    lambda_lng = delta_lng
+    lambda_prime = 2 * pi
+
+    iter_limit = 20
+
+    while abs(lambda_lng - lambda_prime) > 10e-12 and iter_limit > 0:
+        sin_lambda_lng, cos_lambda_lng = sin(lambda_lng), cos(lambda_lng)
+
+        sin_sigma = sqrt(
+            (cos_reduced2 * sin_lambda_lng) ** 2 +
+            (cos_reduced1 * sin_reduced2 -
+             sin_reduced1 * cos_reduced2 * cos_lambda_lng) ** 2
+        )
+
+        if sin_sigma == 0:
+            return 0 # Coincident points
+
+        cos_sigma = (
+            sin_reduced1 * sin_reduced2 +
+            cos_reduced1 * cos_reduced2 * cos_lambda_lng
+        )
+
+        sigma = atan2(sin_sigma, cos_sigma)
+
+        sin_alpha = (
+            cos_reduced1 * cos_reduced2 * sin_lambda_lng / sin_sigma
+        )
+        cos_sq_alpha = 1 - sin_alpha ** 2
+
+        if cos_sq_alpha != 0:
+            cos2_sigma_m = cos_sigma - 2 * (
+                sin_reduced1 * sin_reduced2 / cos_sq_alpha
+            )
+        else:
+            cos2_sigma_m = 0.0 # Equatorial line
+
+        C = f / 16. * cos_sq_alpha * (4 + f * (4 - 3 * cos_sq_alpha))
+
+        lambda_prime = lambda_lng
+        lambda_lng = (
+            delta_lng + (1 - C) * f * sin_alpha * (
+                sigma + C * sin_sigma * (
+                    cos2_sigma_m + C * cos_sigma * (
+                        -1 + 2 * cos2_sigma_m ** 2
+                    )
+                )
+            )
+        )
+        iter_limit -= 1
+
+    if iter_limit == 0:
+        raise ValueError("Vincenty formula failed to converge!")
+
+    u_sq = cos_sq_alpha * (major ** 2 - minor ** 2) / minor ** 2
+
+    A = 1 + u_sq / 16384. * (
+        4096 + u_sq * (-768 + u_sq * (320 - 175 * u_sq))
+    )
+
+    B = u_sq / 1024. * (256 + u_sq * (-128 + u_sq * (74 - 47 * u_sq)))
+
+    delta_sigma = (
+        B * sin_sigma * (
+            cos2_sigma_m + B / 4. * (
+                cos_sigma * (
+                    -1 + 2 * cos2_sigma_m ** 2
+                ) - B / 6. * cos2_sigma_m * (
+                    -3 + 4 * sin_sigma ** 2
+                ) * (
+                    -3 + 4 * cos2_sigma_m ** 2
+                )
+            )
+        )
+    )
+
+    s = minor * A * (sigma - delta_sigma)
+    return s
+
+def _vincenty_key(lat1, lng1, lat2, lng2, ellipsoid='WGS-84'):
+    # Coordinates are quantized to 1e-6 degrees, about 0.1 meters
+    return (int(lat1 * 1e6), int(lng1 * 1e6), int(lat2 * 1e6),
+            int(lng2 * 1e6), ellipsoid)
+
+# vincenty_km remembering about the last VINCENTY_MEMO_SIZE pairs of points.
+# Its hits and misses attributes tell how well the size fits the workload.
+VINCENTY_MEMO_SIZE = 4096
+vincenty_km_memo = util.LRUMemo(vincenty_km, VINCENTY_MEMO_SIZE,
+                                _vincenty_key)
+
 class Distance(object):
+    __slots__ = ('__kilometers',)
+
     def __init__(self, *args, **kwargs):
         kilometers = kwargs.pop('kilometers', 0)
         if len(args) == 1:
@@ -125,36 +271,13 @@ class GreatCircleDistance(Distance):
     
     """
     
+    __slots__ = ()
     RADIUS = EARTH_RADIUS
     
     def measure(self, a, b):
         a, b = Point(a), Point(b)
-        lat1, lng1 = radians(degrees=a.latitude), radians(degrees=a.longitude)
-        lat2, lng2 = radians(degrees=b.latitude), radians(degrees=b.longitude)
-        
-        sin_lat1, cos_lat1 = sin(lat1), cos(lat1)
-        sin_lat2, cos_lat2 = sin(lat2), cos(lat2)
-        
-        delta_lng = lng2 - lng1
-        cos_delta_lng, sin_delta_lng = cos(delta_lng), sin(delta_lng)
-        
-        central_angle = acos(sin_lat1 * sin_lat2 +
-                             cos_lat1 * cos_lat2 * cos_delta_lng)
-        
-        # From http://en.wikipedia.org/wiki/Great_circle_distance:
-        #   Historically, the use of this formula was simplified by the
-        #   availability of tables for the haversine function. Although this
-        #   formula is accurate for most distances, it too suffers from
-        #   rounding errors for the special (and somewhat unusual) case of
-        #   antipodal points (on opposite ends of the sphere). A more
-        #   complicated formula that is accurate for all distances is: (below)
-        
-        d = atan2(sqrt((cos_lat2 * sin_delta_lng) ** 2 +
-                       (cos_lat1 * sin_lat2 -
-                        sin_lat1 * cos_lat2 * cos_delta_lng) ** 2),
-                  sin_lat1 * sin_lat2 + cos_lat1 * cos_lat2 * cos_delta_lng)
-        
-        return self.RADIUS * d
+        return great_circle_km(a.latitude, a.longitude,
+                               b.latitude, b.longitude, self.RADIUS)
 
     def destination(self, point, bearing, distance=None):
         point = Point(point)
@@ -197,103 +320,13 @@ class VincentyDistance(Distance):
     
     """
 
+    __slots__ = ()
     ELLIPSOID = 'WGS-84'
     
     def measure(self, a, b):
         a, b = Point(a), Point(b)
-        lat1, lng1 = radians(degrees=a.latitude), radians(degrees=a.longitude)
-        lat2, lng2 = radians(degrees=b.latitude), radians(degrees=b.longitude)
-
-        if isinstance(self.ELLIPSOID, basestring):
-            major, minor, f = ELLIPSOIDS[self.ELLIPSOID]
-        else:
-            major, minor, f = self.ELLIPSOID
-
-        delta_lng = lng2 - lng1
-
-        reduced_lat1 = atan((1 - f) * tan(lat1))
-        reduced_lat2 = atan((1 - f) * tan(lat2))
-
-        sin_reduced1, cos_reduced1 = sin(reduced_lat1), cos(reduced_lat1)
-        sin_reduced2, cos_reduced2 = sin(reduced_lat2), cos(reduced_lat2)
-
-        lambda_lng = delta_lng
-        lambda_prime = 2 * pi
-
-        iter_limit = 20
-
-        while abs(lambda_lng - lambda_prime) > 10e-12 and iter_limit > 0:
-            sin_lambda_lng, cos_lambda_lng = sin(lambda_lng), cos(lambda_lng)
-
-            sin_sigma = sqrt(
-                (cos_reduced2 * sin_lambda_lng) ** 2 +
-                (cos_reduced1 * sin_reduced2 -
-                 sin_reduced1 * cos_reduced2 * cos_lambda_lng) ** 2
-            )
-
-            if sin_sigma == 0:
-                return 0 # Coincident points
-
-            cos_sigma = (
-                sin_reduced1 * sin_reduced2 +
-                cos_reduced1 * cos_reduced2 * cos_lambda_lng
-            )
-
-            sigma = atan2(sin_sigma, cos_sigma)
-
-            sin_alpha = (
-                cos_reduced1 * cos_reduced2 * sin_lambda_lng / sin_sigma
-            )
-            cos_sq_alpha = 1 - sin_alpha ** 2
-
-            if cos_sq_alpha != 0:
-                cos2_sigma_m = cos_sigma - 2 * (
-                    sin_reduced1 * sin_reduced2 / cos_sq_alpha
-                )
-            else:
-                cos2_sigma_m = 0.0 # Equatorial line
-
-            C = f / 16. * cos_sq_alpha * (4 + f * (4 - 3 * cos_sq_alpha))
-
-            lambda_prime = lambda_lng
-            lambda_lng = (
-                delta_lng + (1 - C) * f * sin_alpha * (
-                    sigma + C * sin_sigma * (
-                        cos2_sigma_m + C * cos_sigma * (
-                            -1 + 2 * cos2_sigma_m ** 2
-                        )
-                    )
-                )
-            )
-            iter_limit -= 1
-
-        if iter_limit == 0:
-            raise ValueError("Vincenty formula failed to converge!")
-
-        u_sq = cos_sq_alpha * (major ** 2 - minor ** 2) / minor ** 2
-
-        A = 1 + u_sq / 16384. * (
-            4096 + u_sq * (-768 + u_sq * (320 - 175 * u_sq))
-        )
-
-        B = u_sq / 1024. * (256 + u_sq * (-128 + u_sq * (74 - 47 * u_sq)))
-
-        delta_sigma = (
-            B * sin_sigma * (
-                cos2_sigma_m + B / 4. * (
-                    cos_sigma * (
-                        -1 + 2 * cos2_sigma_m ** 2
-                    ) - B / 6. * cos2_sigma_m * (
-                        -3 + 4 * sin_sigma ** 2
-                    ) * (
-                        -3 + 4 * cos2_sigma_m ** 2
-                    )
-                )
-            )
-        )
-
-        s = minor * A * (sigma - delta_sigma)
-        return s
+        return vincenty_km_memo(a.latitude, a.longitude,
+                                b.latitude, b.longitude, self.ELLIPSOID)
 
     def destination(self, point, bearing, distance=None):
         point = Point(point)
@@ -1,13 +1,294 @@
+import time
+import Queue
+import collections
+import socket
+import httplib
+import urllib
+import urllib2
+import urlparse
+import threading
+from StringIO import StringIO
+from geopy.point import Point
+
+class HTTPTransport(object):
+    """
+    Performs HTTP GET and POST requests over persistent connections, kept
+    in a pool shared by all the threads. At most max_per_host connections
+    are open to each host at the same time: further requests wait for one
+    of them to be free. timeout is the socket timeout in seconds, and idle
+    connections older than idle_timeout seconds are not reused, since the
+    server has probably closed them already.
+
+    urlopen() answers like urllib2.urlopen: a file-like urllib.addinfourl
+    on success, urllib2.HTTPError on an error status.
+    """
+    MAX_REDIRECTS = 5
+
+    def __init__(self, max_per_host=4, timeout=10, idle_timeout=30):
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.idle = {}
+        self.slots = {}
+        self.lock = threading.Lock()
+
+    def urlopen(self, url, data=None, headers=None):
+        for redirect in xrange(self.MAX_REDIRECTS + 1):
+            status, reason, message, body = self.request(url, data, headers)
+            location = message.getheader('location')
+            if status in (301, 302, 303, 307) and location:
+                url = urlparse.urljoin(url, location)
+                data = None
+                continue
+            break
+        page = urllib.addinfourl(StringIO(body), message, url, status)
+        if status >= 400:
+            raise urllib2.HTTPError(url, status, reason, message, page)
+        return page
+
+    def request(self, url, data=None, headers=None):
+        """
+        Performs a single request, returning (status, reason, headers, body).
+        A GET failing on a reused connection, which the server may have
+        closed meanwhile, is tried again on a new one. POSTs are not, since
+        the server may have received them already.
+        """
+        scheme, netloc, path, query, fragment = urlparse.urlsplit(url)
+        if scheme not in ('http', 'https'):
+            raise urllib2.URLError("Unsupported URL scheme %r" % scheme)
+        key = (scheme, netloc)
+        path = path or '/'
+        if query:
+            path += '?' + query
+        method = data is None and 'GET' or 'POST'
+        headers = dict(headers or {})
+        if data is not None:
+            headers.setdefault('Content-Type',
+                               'application/x-www-form-urlencoded')
+
+        slot = self.get_slot(key)
+        slot.acquire()
+        try:
+            while True:
+                connection, reused = self.get_connection(key)
+                try:
+                    connection.request(method, path, data, headers)
+                    response = connection.getresponse()
+                    body = response.read()
+                except (socket.error, httplib.HTTPException), e:
+                    connection.close()
+                    if (reused and data is None
+                            and not isinstance(e, socket.timeout)):
+                        continue
+                    raise urllib2.URLError(e)
+                if response.will_close:
+                    connection.close()
+                else:
+                    self.put_connection(key, connection)
+                return response.status, response.reason, response.msg, body
+        finally:
+            slot.release()
+
+    def get_slot(self, key):
+        self.lock.acquire()
+        try:
+            if key not in self.slots:
+                self.slots[key] = threading.BoundedSemaphore(
+                    self.max_per_host)
+            return self.slots[key]
+        finally:
+            self.lock.release()
+
+    def get_connection(self, key):
+        """
+        Returns (connection, reused): an idle connection to the host if any,
+        otherwise a new one.
+        """
+        now = time.time()
+        self.lock.acquire()
+        try:
+            idle = self.idle.get(key, [])
+            while idle:
+                connection, timestamp = idle.pop()
+                if now - timestamp < self.idle_timeout:
+                    return connection, True
+                connection.close()
+        finally:
+            self.lock.release()
+        scheme, netloc = key
+        if scheme == 'https':
+            connection_class = httplib.HTTPSConnection
+        else:
+            connection_class = httplib.HTTPConnection
+        return connection_class(netloc, timeout=self.timeout), False
+
+    def put_connection(self, key, connection):
+        self.lock.acquire()
+        try:
+            self.idle.setdefault(key, []).append((connection, time.time()))
+        finally:
+            self.lock.release()
+
+    def close(self):
+        """
+        Closes all the idle connections
+        """
+        self.lock.acquire()
+        try:
+            for idle in self.idle.itervalues():
+                for connection, timestamp in idle:
+                    connection.close()
+            self.idle.clear()
+        finally:
+            self.lock.release()
+
+# The transport shared by all the geocoders, unless given their own
+default_transport = HTTPTransport()
+
+def _call(function, query, exactly_one):
+    try:
+        if exactly_one:
+            # Not all the geocoders take exactly_one
+            return function(query)
+        return list(function(query, exactly_one))
+    except Exception, e:
+        return e
+
+class _Slot(object):
+    __slots__ = ('done', 'value')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+
+def map_ordered(function, queries, key=None, workers=4, batch_size=1):
+    """
+    Yield the results of function for each of the queries, in order, while
+    up to workers threads compute them. function takes a list of at most
+    batch_size queries and returns the list of their results. Queries with
+    the same key(query) are computed once. Queries are read as results are
+    consumed, at most workers * batch_size * 4 ahead of them, so queries
+    may be a long generator. If function raises, the exception is the result
+    of all the queries of its batch.
+    """
+    key = key or (lambda query: query)
+    todo = Queue.Queue()
+    window = workers * batch_size * 4
+
+    def work():
+        while True:
+            batch = todo.get()
+            if batch is None:
+                return
+            try:
+                values = function([query for query, slot in batch])
+            except Exception, e:
+                values = [e] * len(batch)
+            for (query, slot), value in zip(batch, values):
+                slot.value = value
+                slot.done.set()
+
+    threads = []
+    for i in range(workers):
+        thread = threading.Thread(target=work)
+        thread.setDaemon(True)
+        thread.start()
+        threads.append(thread)
+
+    slots = {}
+    pending = []
+    order = collections.deque()
+    try:
+        for query in queries:
+            query_key = key(query)
+            slot = slots.get(query_key)
+            if slot is None:
+                slot = slots[query_key] = _Slot()
+                pending.append((query, slot))
+                if len(pending) >= batch_size:
+                    todo.put(pending)
+                    pending = []
+            order.append(slot)
+            if len(order) >= window:
+                head = order.popleft()
+                if [slot for query, slot in pending if slot is head]:
+                    # The oldest query waits for a batch to fill up
+                    todo.put(pending)
+                    pending = []
+                head.done.wait()
+                yield head.value
+        if pending:
+            todo.put(pending)
+        for slot in order:
+            slot.done.wait()
+            yield slot.value
+    finally:
+        # Stop the workers, dropping the batches not started yet
+        try:
+            while True:
+                todo.get_nowait()
+        except Queue.Empty:
+            pass
+        for thread in threads:
+            todo.put(None)
+
 class Geocoder(object):
+    transport = default_transport
+    # Queries sent at once to geocode_batch() and reverse_batch()
+    batch_size = 1
+    # True for geocoders answering without calling a service, which need no
+    # rate limit
+    local = False
+
     def __init__(self, format_string='%s'):
         self.format_string = format_string
 
+    def urlopen(self, url, data=None):
+        return self.transport.urlopen(url, data)
+
     def geocode(self, location):
         raise NotImplementedError
 
     def reverse(self, point):
         raise NotImplementedError
 
+    def geocode_many(self, strings, exactly_one=True, workers=4):
+        """
+        Yield the results of geocode() for each of the strings, in order,
+        geocoding up to workers of them at the same time [See map_ordered].
+        A string which could not be geocoded yields the exception raised.
+        """
+        return map_ordered(
+            lambda strings: self.geocode_batch(strings, exactly_one),
+            strings, workers=workers, batch_size=self.batch_size)
+
+    def reverse_many(self, points, exactly_one=True, workers=4):
+        """
+        Yield the results of reverse() for each of the points, in order,
+        like geocode_many().
+        """
+        return map_ordered(
+            lambda points: self.reverse_batch(points, exactly_one),
+            points, key=lambda point: tuple(Point(point)[:2]),
+            workers=workers, batch_size=self.batch_size)
+
+    def geocode_batch(self, strings, exactly_one=True):
+        """
+        Return the list of the results of geocode() for the strings, or of
+        the exceptions raised. Geocoders of services taking many queries per
+        request override it, and batch_size.
+        """
+        return [_call(self.geocode, string, exactly_one)
+                for string in strings]
+
+    def reverse_batch(self, points, exactly_one=True):
+        """
+        Return the list of the results of reverse() for the points, or of the
+        exceptions raised, like geocode_batch().
+        """
+        return [_call(self.reverse, point, exactly_one)
+                for point in points]
+
     def geocode_one(self, location):
         results = self.geocode(location)
         first = None
@@ -0,0 +1,187 @@
+import re
+import time
+import sqlite3
+import threading
+import cPickle as pickle
+
+from geopy.geocoders.base import Geocoder
+from geopy import Point
+
+def normalize_address(string):
+    """
+    Return the cache key of an address: lowercased, with runs of whitespace
+    and commas collapsed.
+    """
+    string = re.sub(r'\s*,\s*', ', ', string.strip().lower())
+    return re.sub(r'\s+', ' ', string)
+
+def quantize_point(point, precision=4):
+    """
+    Return the cache key of a point: its latitude and longitude rounded to
+    precision decimal places (4 places are about 11 meters).
+    """
+    point = Point(point)
+    return "%.*f,%.*f" % (precision, point.latitude,
+                          precision, point.longitude)
+
+class CachedGeocoder(Geocoder):
+    """
+    Wraps another geocoder, remembering its results in a SQLite database, a
+    file shared by all the processes or ':memory:'. Addresses are looked up
+    by normalize_address(), points by quantize_point(). Results are kept for
+    ttl seconds, and once there are more than max_entries of them the least
+    recently used ones are evicted, checking every EVICT_EVERY new results.
+    Failed lookups are not cached.
+    Hits only note the time they were used in memory, written in a single
+    transaction every FLUSH_EVERY hits and before evicting, so that reads
+    don't take the write lock of the database. File databases are opened in
+    WAL mode for the same reason. Errors of the database (e.g. a lock held
+    by another process for more than timeout seconds, or a corrupt file)
+    don't fail lookups: they are taken for misses, and their results are not
+    stored.
+    hits and misses count the lookups answered by the cache and the ones
+    passed to the geocoder, errors the failed operations on the database.
+    """
+    EVICT_EVERY = 100
+    FLUSH_EVERY = 100
+
+    def __init__(self, geocoder, path=':memory:', ttl=30 * 24 * 3600,
+                 max_entries=100000, precision=4, timeout=5):
+        self.geocoder = geocoder
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.precision = precision
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.used = {}
+        self.unflushed = 0
+        self.lock = threading.Lock()
+        self.stores = 0
+        self.connection = sqlite3.connect(path, timeout=timeout,
+                                          check_same_thread=False,
+                                          isolation_level=None)
+        try:
+            if path != ':memory:':
+                self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS geocodes ("
+                "key TEXT PRIMARY KEY, result BLOB, expires REAL, used REAL)")
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS geocodes_used ON geocodes (used)")
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS geocodes_expires "
+                "ON geocodes (expires)")
+        except sqlite3.Error:
+            self.errors += 1
+
+    def geocode(self, string, exactly_one=True):
+        key = "geocode:%d:%s" % (exactly_one, normalize_address(string))
+        return self.lookup(key, self.geocoder.geocode, string, exactly_one)
+
+    def reverse(self, point, exactly_one=True):
+        key = "reverse:%d:%s" % (exactly_one,
+                                 quantize_point(point, self.precision))
+        return self.lookup(key, self.geocoder.reverse, point, exactly_one)
+
+    def lookup(self, key, function, query, exactly_one):
+        """
+        Return the cached result for key, or compute it with
+        function(query, exactly_one) and cache it.
+        """
+        now = time.time()
+        self.lock.acquire()
+        try:
+            try:
+                # fetchall() ends the statement, and its read transaction
+                rows = self.connection.execute(
+                    "SELECT result FROM geocodes WHERE key = ? AND expires > ?",
+                    (key, now)).fetchall()
+            except sqlite3.Error:
+                self.errors += 1
+                rows = None
+            if rows:
+                self.hits += 1
+                self.used[key] = now
+                self.unflushed += 1
+                if self.unflushed >= self.FLUSH_EVERY:
+                    self.flush()
+                return pickle.loads(str(rows[0][0]))
+            self.misses += 1
+        finally:
+            self.lock.release()
+
+        result = function(query, exactly_one)
+        if not exactly_one:
+            # Geocoders may return generators, which can't be stored
+            result = list(result)
+        self.store(key, result)
+        return result
+
+    def store(self, key, result):
+        now = time.time()
+        self.lock.acquire()
+        try:
+            try:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO geocodes VALUES (?, ?, ?, ?)",
+                    (key, sqlite3.Binary(pickle.dumps(result, 2)),
+                     now + self.ttl, now))
+                self.used.pop(key, None)
+                self.stores += 1
+                if self.stores % self.EVICT_EVERY == 0:
+                    self.flush()
+                    self.evict(now)
+            except sqlite3.Error:
+                self.errors += 1
+        finally:
+            self.lock.release()
+
+    def flush(self):
+        """
+        Write the times the cached results were last used. Call it holding
+        the lock; if it fails, the times are dropped.
+        """
+        used, self.used = self.used, {}
+        self.unflushed = 0
+        if not used:
+            return
+        try:
+            self.connection.execute("BEGIN")
+            self.connection.executemany(
+                "UPDATE geocodes SET used = ? WHERE key = ?",
+                [(when, key) for key, when in used.iteritems()])
+            self.connection.execute("COMMIT")
+        except sqlite3.Error:
+            self.errors += 1
+            try:
+                self.connection.execute("ROLLBACK")
+            except sqlite3.Error:
+                pass
+
+    def evict(self, now):
+        self.connection.execute("DELETE FROM geocodes WHERE expires <= ?",
+                                (now,))
+        count = self.connection.execute(
+            "SELECT COUNT(*) FROM geocodes").fetchone()[0]
+        if count > self.max_entries:
+            self.connection.execute(
+                "DELETE FROM geocodes WHERE key IN (SELECT key FROM geocodes "
+                "ORDER BY used LIMIT ?)", (count - self.max_entries,))
+
+    def clear(self):
+        self.lock.acquire()
+        try:
+            self.used.clear()
+            self.connection.execute("DELETE FROM geocodes")
+        finally:
+            self.lock.release()
+
+    def __len__(self):
+        self.lock.acquire()
+        try:
+            return self.connection.execute(
+                "SELECT COUNT(*) FROM geocodes").fetchone()[0]
+        finally:
+            self.lock.release()
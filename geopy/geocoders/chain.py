@@ -0,0 +1,260 @@
+import time
+import threading
+
+from geopy.geocoders.base import Geocoder, GeocoderError
+
+class TokenBucket(object):
+    """
+    Allows on average rate calls per second, in bursts of at most capacity
+    calls.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self.tokens = self.capacity
+        self.timestamp = time.time()
+        self.lock = threading.Lock()
+
+    def take(self):
+        """
+        Return True and consume a token if one is available.
+        """
+        self.lock.acquire()
+        try:
+            now = time.time()
+            self.tokens = min(self.capacity,
+                              self.tokens + (now - self.timestamp) * self.rate)
+            self.timestamp = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+        finally:
+            self.lock.release()
+
+    def refund(self):
+        """
+        Give back a token taken for a call which wasn't made.
+        """
+        self.lock.acquire()
+        try:
+            self.tokens = min(self.capacity, self.tokens + 1)
+        finally:
+            self.lock.release()
+
+
+class CircuitBreaker(object):
+    """
+    Opens after max_failures consecutive failures, a call slower than slow
+    seconds counting as a failure. While open, calls are not allowed; after
+    reset_timeout seconds a single trial call is, which closes the breaker
+    if it succeeds and opens it again otherwise. Every allowed call must be
+    followed by succeeded(), failed() or cancelled().
+    """
+
+    def __init__(self, max_failures=5, reset_timeout=60, slow=5):
+        self.max_failures = max_failures
+        self.reset_timeout = reset_timeout
+        self.slow = slow
+        self.failures = 0
+        self.opened = None
+        self.trial = False
+        self.lock = threading.Lock()
+
+    def allow(self):
+        self.lock.acquire()
+        try:
+            if self.opened is None:
+                return True
+            if time.time() - self.opened >= self.reset_timeout:
+                # Half open: let one call through, keep the others out
+                self.opened = time.time()
+                self.trial = True
+                return True
+            return False
+        finally:
+            self.lock.release()
+
+    def succeeded(self, elapsed):
+        if elapsed > self.slow:
+            self.failed()
+            return
+        self.lock.acquire()
+        try:
+            self.failures = 0
+            self.opened = None
+            self.trial = False
+        finally:
+            self.lock.release()
+
+    def failed(self):
+        self.lock.acquire()
+        try:
+            self.failures += 1
+            self.trial = False
+            if self.failures >= self.max_failures:
+                self.opened = time.time()
+        finally:
+            self.lock.release()
+
+    def cancelled(self):
+        """
+        The allowed call wasn't made: if it was the trial call, let the next
+        one be the trial.
+        """
+        self.lock.acquire()
+        try:
+            if self.trial:
+                self.opened = time.time() - self.reset_timeout
+                self.trial = False
+        finally:
+            self.lock.release()
+
+    @property
+    def is_open(self):
+        return self.opened is not None
+
+
+class Provider(object):
+    """
+    A geocoder of a GeocoderChain with its rate limit, circuit breaker and
+    counters: calls made, errors raised (failures are the errors reaching
+    the service: IOErrors, e.g. timeouts and HTTP errors), calls skipped
+    because of the limit or the breaker, and the total latency of the calls.
+    A geocoder supports a method if it overrides the one of Geocoder, which
+    just raises NotImplementedError. Local geocoders, and all of them if rate
+    is None, have no rate limit: their bucket is None.
+    """
+
+    def __init__(self, geocoder, rate=10, max_failures=5, reset_timeout=60,
+                 slow=5):
+        self.geocoder = geocoder
+        if rate is None or getattr(geocoder, 'local', False):
+            self.bucket = None
+        else:
+            self.bucket = TokenBucket(rate)
+        self.breaker = CircuitBreaker(max_failures, reset_timeout, slow)
+        self.calls = 0
+        self.errors = 0
+        self.failures = 0
+        self.skipped = 0
+        self.latency = 0.0
+        self.lock = threading.Lock()
+
+    @property
+    def name(self):
+        return self.geocoder.__class__.__name__
+
+    def supports(self, method):
+        function = getattr(self.geocoder, method, None)
+        if function is None:
+            return False
+        return getattr(function, 'im_func', None) is not \
+            getattr(Geocoder, method).im_func
+
+    def record(self, elapsed, error=None):
+        """
+        Count a call which took elapsed seconds and raised error, if any.
+        """
+        self.lock.acquire()
+        try:
+            self.calls += 1
+            self.latency += elapsed
+            if error is not None:
+                self.errors += 1
+                if isinstance(error, IOError):
+                    self.failures += 1
+        finally:
+            self.lock.release()
+
+    def skip(self):
+        self.lock.acquire()
+        try:
+            self.skipped += 1
+        finally:
+            self.lock.release()
+
+    def stats(self):
+        self.lock.acquire()
+        try:
+            return {'calls': self.calls,
+                    'errors': self.errors,
+                    'failures': self.failures,
+                    'skipped': self.skipped,
+                    'latency': self.calls and self.latency / self.calls or 0.0,
+                    'open': self.breaker.is_open}
+        finally:
+            self.lock.release()
+
+
+class GeocoderChain(Geocoder):
+    """
+    Tries its geocoders in order, falling through to the next one when a
+    geocoder raises an error, is over its rate limit or has its circuit
+    breaker open. Geocoders not supporting a method are skipped by it,
+    without taking a token or a breaker trial. The keyword arguments are
+    given to each Provider.
+
+    """
+
+    def __init__(self, geocoders, **kwargs):
+        self.providers = [Provider(geocoder, **kwargs)
+                          for geocoder in geocoders]
+
+    def geocode(self, string, exactly_one=True):
+        return self.call('geocode', string, exactly_one)
+
+    def reverse(self, point, exactly_one=True):
+        return self.call('reverse', point, exactly_one)
+
+    def call(self, method, query, exactly_one):
+        errors = []
+        for provider in self.providers:
+            if not provider.supports(method):
+                continue
+            if not provider.breaker.allow():
+                provider.skip()
+                continue
+            if provider.bucket is not None and not provider.bucket.take():
+                provider.breaker.cancelled()
+                provider.skip()
+                continue
+
+            start = time.time()
+            try:
+                result = getattr(provider.geocoder, method)(query, exactly_one)
+                if not exactly_one:
+                    # Errors of lazy results must happen here
+                    result = list(result)
+            except NotImplementedError:
+                # e.g. an output format the geocoder can't parse
+                provider.breaker.cancelled()
+                if provider.bucket is not None:
+                    provider.bucket.refund()
+                continue
+            except Exception, e:
+                elapsed = time.time() - start
+                provider.record(elapsed, e)
+                if isinstance(e, IOError):
+                    provider.breaker.failed()
+                else:
+                    # The service answered, e.g. with no results
+                    provider.breaker.succeeded(elapsed)
+                errors.append((provider.name, e))
+                continue
+
+            elapsed = time.time() - start
+            provider.record(elapsed)
+            provider.breaker.succeeded(elapsed)
+            return result
+
+        raise GeocoderError("No geocoder could answer %r: %r" % (query, errors))
+
+    def stats(self):
+        """
+        Return a list of (geocoder name, counters of its Provider), in the
+        order the geocoders are tried.
+        """
+        return [(provider.name, provider.stats())
+                for provider in self.providers]
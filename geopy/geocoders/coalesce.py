@@ -0,0 +1,88 @@
+import threading
+
+from geopy.geocoders.base import Geocoder
+from geopy.geocoders.cache import normalize_address, quantize_point
+
+class Flight(object):
+    """
+    A lookup in progress: the threads asking for the same one wait for its
+    result, or for the exception it raised.
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class CoalescingGeocoder(Geocoder):
+    """
+    Wraps another geocoder so that concurrent identical lookups make a
+    single call to it, all of them getting its result or its exception.
+    Addresses are the same lookup if their normalize_address() is, points if
+    their quantize_point() is. Unlike CachedGeocoder, results are only
+    shared while the call is in progress.
+    calls and coalesced count the lookups passed to the geocoder and the
+    ones which waited for another.
+    """
+
+    def __init__(self, geocoder, precision=4):
+        self.geocoder = geocoder
+        self.precision = precision
+        self.flights = {}
+        self.calls = 0
+        self.coalesced = 0
+        self.lock = threading.Lock()
+
+    def geocode(self, string, exactly_one=True):
+        key = "geocode:%d:%s" % (exactly_one, normalize_address(string))
+        return self.lookup(key, self.geocoder.geocode, string, exactly_one)
+
+    def reverse(self, point, exactly_one=True):
+        key = "reverse:%d:%s" % (exactly_one,
+                                 quantize_point(point, self.precision))
+        return self.lookup(key, self.geocoder.reverse, point, exactly_one)
+
+    def lookup(self, key, function, query, exactly_one):
+        """
+        Return the result of function(query, exactly_one), waiting for the
+        call in progress for key if any.
+        """
+        self.lock.acquire()
+        try:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = Flight()
+                self.calls += 1
+            else:
+                self.coalesced += 1
+        finally:
+            self.lock.release()
+        if not leader:
+            return flight.wait()
+
+        try:
+            try:
+                result = function(query, exactly_one)
+                if not exactly_one:
+                    # Generators can't be shared between threads
+                    result = list(result)
+                flight.result = result
+            except Exception, e:
+                flight.error = e
+                raise
+        finally:
+            self.lock.acquire()
+            try:
+                del self.flights[key]
+            finally:
+                self.lock.release()
+            flight.done.set()
+        return result
@@ -1,7 +1,6 @@
 import logging
 
 from urllib import urlencode
-from urllib2 import urlopen
 import simplejson
 
 import xml
@@ -44,7 +43,7 @@ class GeoNames(Geocoder):
     
     def geocode_url(self, url, exactly_one=True, reverse=False):
 	logging.getLogger().info("Fetching %s..." % url)
-        page = urlopen(url)
+        page = self.urlopen(url)
         dispatch = getattr(self, 'parse_' + self.output_format)
         return dispatch(page, exactly_one, reverse)
 
@@ -1,12 +1,8 @@
 import logging
 
 from urllib import urlencode
-from urllib2 import urlopen
 import simplejson
 
-import xml
-from xml.parsers.expat import ExpatError
-
 from geopy.geocoders.base import Geocoder
 from geopy import Point, Location, util
 
@@ -78,32 +74,22 @@ class Google(Geocoder):
 
     def geocode_url(self, url, exactly_one=True, reverse=False):
         logging.getLogger().info("Fetching %s..." % url)
-        page = urlopen(url)
+        page = self.urlopen(url)
         
         dispatch = getattr(self, 'parse_' + self.output_format)
         return dispatch(page, exactly_one, reverse)
 
     def parse_xml(self, page, exactly_one=True, reverse=False):
         """Parse a location name, latitude, and longitude from an XML response.
+        Placemarks are parsed as they are needed: a single one if exactly_one
+        and reverse, two if exactly_one, to check that there is no other.
         """
-        if not isinstance(page, basestring):
-            page = util.decode_page(page)
-        try:
-            doc = xml.dom.minidom.parseString(page)
-        except ExpatError:
-            places = []
-        else:
-            places = doc.getElementsByTagName('Placemark')
+        places = util.iter_elements(page, 'Placemark')
 
-        if (exactly_one and len(places) != 1) and (not reverse):
-	    raise ValueError("Didn't find exactly one placemark! " \
-			     "(Found %d.)" % len(places))
-        
         def parse_place(place):
-            location = util.get_first_text(place, ['address', 'name']) or None
-            points = place.getElementsByTagName('Point')
-            point = points and points[0] or None
-            coords = util.get_first_text(point, 'coordinates') or None
+            location = util.get_element_text(place, ['address', 'name']) or None
+            point = util.find_element(place, 'Point')
+            coords = util.get_element_text(point, 'coordinates') or None
             if coords:
                 longitude, latitude = [float(f) for f in coords.split(',')[:2]]
             else:
@@ -112,7 +98,8 @@ class Google(Geocoder):
             return (location, (latitude, longitude))
         
         if exactly_one:
-            return parse_place(places[0])
+            return parse_place(util.get_one(places, 'placemark',
+                                            strict=not reverse))
         else:
             return (parse_place(place) for place in places)
 
@@ -125,13 +112,11 @@ class Google(Geocoder):
     def parse_json(self, page, exactly_one=True, reverse=False):
         if not isinstance(page, basestring):
             page = util.decode_page(page)
-        json = simplejson.loads(page)
-        places = json.get('Placemark', [])
-
-
-        if (exactly_one and len(places) != 1) and (not reverse):
-            raise ValueError("Didn't find exactly one placemark! " \
-                             "(Found %d.)" % len(places))
+        # A single placemark is needed for reverse, two to check that there
+        # is exactly one otherwise
+        limit = exactly_one and (reverse and 1 or 2) or None
+        places = util.iter_json_items(page, 'Placemark',
+                                      simplejson.JSONDecoder(), limit)
 
         def parse_place(place):
             location = place.get('address')
@@ -144,7 +129,8 @@ class Google(Geocoder):
             return util.RichResult((location, (latitude, longitude)), locality=locality, administrative=administrative)
         
         if exactly_one:
-            return parse_place(places[0])
+            return parse_place(util.get_one(places, 'placemark',
+                                            strict=not reverse))
         else:
             return (parse_place(place) for place in places)
 
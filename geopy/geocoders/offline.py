@@ -0,0 +1,153 @@
+import mmap
+import struct
+import codecs
+
+from geopy.geocoders.base import Geocoder, GeocoderError
+from geopy.geohash import Geohash
+from geopy.distance import great_circle_km
+from geopy import Point
+
+MAGIC = 'GEOTAB1\0'
+HEADER = struct.Struct('<8sI')
+# geohash as integer, latitude, longitude, offset of the name, country code
+RECORD = struct.Struct('<QffI2s')
+PRECISION = 12
+
+def compile_gazetteer(source, path, min_population=0):
+    """
+    Compile a GeoNames dump (e.g. cities1000.txt from
+    http://download.geonames.org/export/dump/) into a table for
+    OfflineGeocoder: fixed size records sorted by the integer geohash of
+    their place, followed by the names of the places. Places with less than
+    min_population inhabitants are left out. Return the number of places.
+    """
+    geohash = Geohash(precision=PRECISION)
+    places = []
+    names = []
+    names_size = 0
+    for line in codecs.open(source, encoding='utf-8'):
+        fields = line.rstrip('\n').split('\t')
+        if len(fields) < 15:
+            continue
+        if int(fields[14] or 0) < min_population:
+            continue
+        latitude, longitude = float(fields[4]), float(fields[5])
+        name = fields[1].encode('utf-8') + '\0'
+        places.append((geohash.encode_int(latitude, longitude), latitude,
+                       longitude, names_size, str(fields[8][:2])))
+        names.append(name)
+        names_size += len(name)
+    places.sort()
+
+    table = open(path, 'wb')
+    try:
+        table.write(HEADER.pack(MAGIC, len(places)))
+        for place in places:
+            table.write(RECORD.pack(*place))
+        table.write(''.join(names))
+    finally:
+        table.close()
+    return len(places)
+
+
+class OfflineGeocoder(Geocoder):
+    """
+    Reverse geocodes points to the nearest place of a table compiled by
+    compile_gazetteer(), without network calls. The table is memory mapped,
+    so it is shared by all the processes using it and only the pages
+    actually read are loaded. Results look like the ones of the other
+    geocoders: (u'Town, CC', (latitude, longitude)) where CC is the country
+    code and the coordinates are the ones of the place.
+
+    The records next to the point in geohash order bound the distance of the
+    nearest places, which are then looked for in the geohash cells covering
+    the circle of that radius around the point.
+    """
+    WINDOW = 8
+    local = True
+
+    def __init__(self, path):
+        self.path = path
+        self.geohash = Geohash(precision=PRECISION)
+        table = open(path, 'rb')
+        try:
+            self.table = mmap.mmap(table.fileno(), 0, access=mmap.ACCESS_READ)
+        finally:
+            table.close()
+        magic, self.count = HEADER.unpack_from(self.table, 0)
+        if magic != MAGIC:
+            raise GeocoderError("%s is not a gazetteer table." % path)
+        self.names_offset = HEADER.size + self.count * RECORD.size
+
+    def reverse(self, point, exactly_one=True):
+        point = Point(point)
+        places = self.nearest(point.latitude, point.longitude,
+                              exactly_one and 1 or 10)
+        if exactly_one:
+            if not places:
+                raise ValueError("No place found near %r." % (point,))
+            return places[0]
+        return places
+
+    def nearest(self, latitude, longitude, count=1):
+        """
+        Return the results for the count places nearest to the point, the
+        nearest first.
+        """
+        if not self.count:
+            return []
+        index = self.bisect(self.geohash.encode_int(latitude, longitude))
+        window = max(count, self.WINDOW)
+        bounds = sorted(
+            self.get_distance(latitude, longitude, self.get_record(i))
+            for i in xrange(max(index - window, 0),
+                            min(index + window, self.count)))
+        # Some slack against rounding, the bounding places must be found
+        radius = bounds[min(count, len(bounds)) - 1] * 1.0001 + 1e-6
+
+        found = []
+        for cell in self.geohash.cover(latitude, longitude, radius):
+            start, end = self.get_range(cell)
+            for index in xrange(start, end):
+                record = self.get_record(index)
+                distance = self.get_distance(latitude, longitude, record)
+                if distance <= radius:
+                    found.append((distance, record))
+        found.sort()
+        return [self.get_result(record) for distance, record in found[:count]]
+
+    def get_record(self, index):
+        return RECORD.unpack_from(self.table, HEADER.size + index * RECORD.size)
+
+    def get_distance(self, latitude, longitude, record):
+        return great_circle_km(latitude, longitude, record[1], record[2])
+
+    def get_range(self, cell):
+        """
+        Return the (start, end) indexes of the records inside a geohash cell.
+        """
+        shift = 5 * (PRECISION - len(cell))
+        prefix = self.geohash.to_int(cell)
+        return (self.bisect(prefix << shift),
+                self.bisect((prefix + 1) << shift))
+
+    def bisect(self, key):
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if struct.unpack_from('<Q', self.table,
+                                  HEADER.size + middle * RECORD.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def get_result(self, record):
+        key, latitude, longitude, name_offset, country = record
+        start = self.names_offset + name_offset
+        name = self.table[start:self.table.find('\0', start)].decode('utf-8')
+        return (u"%s, %s" % (name, country.decode('ascii')),
+                (latitude, longitude))
+
+    def close(self):
+        self.table.close()
@@ -1,5 +1,4 @@
 import re
-from urllib2 import urlopen
 from urllib import urlencode
 import simplejson
 from geopy.geocoders.base import Geocoder
@@ -36,7 +35,7 @@ class VirtualEarth(Geocoder):
 
     def geocode_url(self, url, exactly_one=True):
         print "Fetching %s..." % url
-        page = urlopen(url)
+        page = self.urlopen(url)
         return self.parse_javascript(page, exactly_one)
 
     def parse_javascript(self, page, exactly_one=True):
@@ -73,12 +73,12 @@ class SemanticMediaWiki(Geocoder):
             attempted = set()
 
         print "Fetching %s..." % url
-        page = urlopen(url)
+        page = self.urlopen(url)
         soup = BeautifulSoup(page)
 
         rdf_url = self.parse_rdf_link(soup)
         print "Fetching %s..." % rdf_url
-        page = urlopen(rdf_url)
+        page = self.urlopen(rdf_url)
 
         things, thing = self.parse_rdf(page)
         name = self.get_label(thing)
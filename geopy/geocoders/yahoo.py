@@ -2,7 +2,7 @@ import xml.dom.minidom
 from geopy import util
 from geopy import Point, Location
 from urllib import urlencode
-from urllib2 import urlopen, HTTPError
+from urllib2 import HTTPError
 from geopy.geocoders.base import Geocoder
 
 
@@ -25,7 +25,7 @@ class Yahoo(Geocoder):
 
     def geocode_url(self, url):
         print "Fetching %s..." % url
-        page = urlopen(url)
+        page = self.urlopen(url)
 
         parse = getattr(self, 'parse_' + self.output_format)
         return parse(page)
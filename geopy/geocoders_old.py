@@ -7,7 +7,7 @@ import htmlentitydefs
 import xml.dom.minidom
 from itertools import groupby
 from urllib import quote_plus, urlencode
-from urllib2 import urlopen, HTTPError
+from urllib2 import HTTPError
 from xml.parsers.expat import ExpatError
 from point import Point
 try:
@@ -18,6 +18,7 @@ except NameError:
 # Other submodules from geopy:
 
 import util
+from geopy.geocoders.base import Geocoder as BaseGeocoder
 
 # Now try some more exotic modules...
 
@@ -37,7 +38,7 @@ except ImportError:
               "Geocoders relying on JSON parsing will not work."
 
 
-class Geocoder(object):
+class Geocoder(BaseGeocoder):
     """Base class for all geocoders."""
 
     def geocode(self, string):
@@ -121,7 +122,7 @@ class MediaWiki(WebGeocoder):
 
     def geocode_url(self, url):
         print "Fetching %s..." % url
-        page = urlopen(url)
+        page = self.urlopen(url)
         name, (latitude, longitude) = self.parse_xhtml(page)
         return util.RichResult((name, (latitude, longitude)), name=name,
                 latitude=latitude, longitude=longitude)
@@ -200,13 +201,13 @@ class SemanticMediaWiki(MediaWiki):
             tried = set()
 
         print "Fetching %s..." % url
-        page = urlopen(url)
+        page = self.urlopen(url)
         soup = BeautifulSoup(page)
         name, (latitude, longitude) = self.parse_xhtml(soup)
         if None in (name, latitude, longitude) or self.prefer_semantic:
             rdf_url = self.parse_rdf_link(soup)
             print "Fetching %s..." % rdf_url
-            page = urlopen(rdf_url)
+            page = self.urlopen(rdf_url)
             
             things, thing = self.parse_rdf(page)
             name = self.get_label(thing)
@@ -345,7 +346,7 @@ class Google(WebGeocoder):
 
     def geocode_url(self, url, exactly_one=True, reverse=False):
         print "Fetching %s..." % url
-        page = urlopen(url)
+        page = self.urlopen(url)
         
         dispatch = getattr(self, 'parse_' + self.output_format)
         return dispatch(page, exactly_one, reverse)
@@ -353,25 +354,15 @@ class Google(WebGeocoder):
     
     def parse_xml(self, page, exactly_one=True, reverse=False):
         """Parse a location name, latitude, and longitude from an XML response.
+        Placemarks are parsed as they are needed: a single one if exactly_one
+        and reverse, two if exactly_one, to check that there is no other.
         """
-        if not isinstance(page, basestring):
-            page = self._decode_page(page)
-        try:
-            doc = xml.dom.minidom.parseString(page)
-        except ExpatError:
-            places = []
-        else:
-            places = doc.getElementsByTagName('Placemark')
-	
-	if (exactly_one and len(places) != 1) and (not reverse):
-	    raise ValueError("Didn't find exactly one placemark! " \
-			     "(Found %d.)" % len(places))
-	
+        places = util.iter_elements(page, 'Placemark')
+
         def parse_place(place):
-            location = self._get_first_text(place, ['address', 'name']) or None
-            points = place.getElementsByTagName('Point')
-            point = points and points[0] or None
-            coords = self._get_first_text(point, 'coordinates') or None
+            location = util.get_element_text(place, ['address', 'name']) or None
+            point = util.find_element(place, 'Point')
+            coords = util.get_element_text(point, 'coordinates') or None
             if coords:
                 longitude, latitude = [float(f) for f in coords.split(',')[:2]]
             else:
@@ -381,7 +372,8 @@ class Google(WebGeocoder):
                     latitude=latitude, longitude=longitude)
         
         if exactly_one:
-            return parse_place(places[0])
+            return parse_place(util.get_one(places, 'placemark',
+                                            strict=not reverse))
         else:
             return (parse_place(place) for place in places)
 
@@ -394,12 +386,11 @@ class Google(WebGeocoder):
     def parse_json(self, page, exactly_one=True, reverse=False):
         if not isinstance(page, basestring):
             page = self._decode_page(page)
-        json = simplejson.loads(page)
-        places = json.get('Placemark', [])
-	
-        if (exactly_one and len(places) != 1) and (not reverse):
-            raise ValueError("Didn't find exactly one placemark! " \
-                             "(Found %d.)" % len(places))
+        # A single placemark is needed for reverse, two to check that there
+        # is exactly one otherwise
+        limit = exactly_one and (reverse and 1 or 2) or None
+        places = util.iter_json_items(page, 'Placemark',
+                                      simplejson.JSONDecoder(), limit)
 
         def parse_place(place):
             location = place.get('address')
@@ -414,7 +405,8 @@ class Google(WebGeocoder):
                     locality=locality, administrative=administrative)
         
         if exactly_one:
-            return parse_place(places[0])
+            return parse_place(util.get_one(places, 'placemark',
+                                            strict=not reverse))
         else:
             return (parse_place(place) for place in places)
 
@@ -493,7 +485,7 @@ class Yahoo(WebGeocoder):
     
     def geocode_url(self, url, exactly_one=True):
         print "Fetching %s..." % url
-        page = urlopen(url)
+        page = self.urlopen(url)
         
         parse = getattr(self, 'parse_' + self.output_format)
         return parse(page, exactly_one)
@@ -625,7 +617,7 @@ class GeocoderDotUS(WebGeocoder):
     def geocode_rest(self, string, exactly_one=True):
         params = {'address': self.format_string % string}
         url = self.url % urlencode(params)
-        page = urlopen(url)
+        page = self.urlopen(url)
         return self.parse_rdf(page, exactly_one)
 
     def parse_rdf(self, page, exactly_one=True):
@@ -686,7 +678,7 @@ class VirtualEarth(WebGeocoder):
 
     def geocode_url(self, url, exactly_one=True):
         print "Fetching %s..." % url
-        page = urlopen(url)
+        page = self.urlopen(url)
         return self.parse_javascript(page, exactly_one)
 
     def parse_javascript(self, page, exactly_one=True):
@@ -754,7 +746,7 @@ class GeoNames(WebGeocoder):
 	return self.geocode_url(url, exactly_one, reverse=True)
     
     def geocode_url(self, url, exactly_one=True, reverse=False):
-        page = urlopen(url)
+        page = self.urlopen(url)
         dispatch = getattr(self, 'parse_' + self.output_format)
         return dispatch(page, exactly_one, reverse)
 
@@ -1,10 +1,20 @@
+import math
 from geopy import Point
+from geopy.distance import EARTH_RADIUS, great_circle_km
+
+class GeohashPoint(Point):
+    """
+    A Point decoded from a geohash. error holds the (latitude, longitude)
+    half-size in degrees of the cell of the geohash.
+    """
+    __slots__ = ('error',)
+
 
 class Geohash(object):
     ENCODE_MAP = '0123456789bcdefghjkmnpqrstuvwxyz'
     DECODE_MAP = dict([(char, i) for i, char in enumerate(ENCODE_MAP)])
 
-    def __init__(self, point_class=Point, precision=12):
+    def __init__(self, point_class=GeohashPoint, precision=12):
         self.point_class = point_class
         self.precision = precision
 
@@ -38,6 +48,17 @@ class Geohash(object):
         return ''.join([self.ENCODE_MAP[byte] for byte in bytes])
 
     def decode(self, string):
+        latitude, longitude, error = self.decode_cell(string)
+        point = self.point_class((latitude, longitude))
+        if isinstance(point, GeohashPoint):
+            point.error = error
+        return point
+
+    def decode_cell(self, string):
+        """
+        Return the latitude and longitude of the center of the cell of a
+        geohash, and its (latitude, longitude) half-size in degrees.
+        """
         lat_min, latitude, lat_max = -90, 0, 90
         long_min, longitude, long_max = -180, 0, 180
         odd_bit = False
@@ -45,7 +66,7 @@ class Geohash(object):
             try:
                 byte = self.DECODE_MAP[char]
             except KeyError:
-                raise ValueError("Invalid hash: unexpected character %r." % (c,))
+                raise ValueError("Invalid hash: unexpected character %r." % (char,))
             else:
                 for bit in (16, 8, 4, 2, 1):
                     if odd_bit:
@@ -61,6 +82,173 @@ class Geohash(object):
                             long_max = longitude
                         longitude = (long_min + long_max) / 2.
                     odd_bit = not odd_bit
-        point = self.point_class((latitude, longitude))
-        point.error = (lat_max - latitude, long_max - longitude)
-        return point
+        return latitude, longitude, (lat_max - latitude, long_max - longitude)
+
+    def bbox(self, string):
+        """
+        Return the (lat_min, lat_max, long_min, long_max) bounds of the cell
+        of a geohash.
+        """
+        latitude, longitude, (lat_error, long_error) = self.decode_cell(string)
+        return (latitude - lat_error, latitude + lat_error,
+                longitude - long_error, longitude + long_error)
+
+    def encode_int(self, *args, **kwargs):
+        """
+        Like encode, but return the geohash as an integer of 5 * precision
+        interleaved bits, longitude first.
+        """
+        return self.to_int(self.encode(*args, **kwargs))
+
+    def decode_int(self, value, precision=None):
+        """
+        Like decode, given the integer form of a geohash.
+        """
+        return self.decode(self.from_int(value, precision))
+
+    def to_int(self, string):
+        value = 0
+        for char in string:
+            try:
+                value = value << 5 | self.DECODE_MAP[char]
+            except KeyError:
+                raise ValueError("Invalid hash: unexpected character %r." % (char,))
+        return value
+
+    def from_int(self, value, precision=None):
+        if precision is None:
+            precision = self.precision
+        return ''.join([self.ENCODE_MAP[value >> 5 * i & 31]
+                        for i in xrange(precision - 1, -1, -1)])
+
+    def _split(self, string):
+        """
+        Return the (latitude, longitude) row and column of the cell of a
+        geohash, in the grid of the cells of the same precision.
+        """
+        value = self.to_int(string)
+        lat_index = long_index = 0
+        for i in xrange(5 * len(string) - 1, -1, -1):
+            if (5 * len(string) - 1 - i) % 2:
+                lat_index = lat_index << 1 | value >> i & 1
+            else:
+                long_index = long_index << 1 | value >> i & 1
+        return lat_index, long_index
+
+    def _join(self, lat_index, long_index, precision):
+        """
+        Return the geohash of the cell at the given row and column of the
+        grid of the cells of the given precision. Columns wrap around.
+        """
+        lat_bits, long_bits = self._grid_bits(precision)
+        long_index %= 1 << long_bits
+        value = 0
+        for i in xrange(5 * precision):
+            if i % 2:
+                lat_bits -= 1
+                value = value << 1 | lat_index >> lat_bits & 1
+            else:
+                long_bits -= 1
+                value = value << 1 | long_index >> long_bits & 1
+        return self.from_int(value, precision)
+
+    def _grid_bits(self, precision):
+        lat_bits = 5 * precision // 2
+        return lat_bits, 5 * precision - lat_bits
+
+    def adjacent(self, string, direction):
+        """
+        Return the geohash of the cell next to the given one in direction
+        'n', 's', 'e' or 'w', or None past a pole.
+        """
+        lat_index, long_index = self._split(string)
+        lat_bits, long_bits = self._grid_bits(len(string))
+        lat_delta, long_delta = {'n': (1, 0), 's': (-1, 0),
+                                 'e': (0, 1), 'w': (0, -1)}[direction]
+        lat_index += lat_delta
+        if not 0 <= lat_index < 1 << lat_bits:
+            return None
+        return self._join(lat_index, long_index + long_delta, len(string))
+
+    def neighbors(self, string):
+        """
+        Return the geohashes of the (up to) 8 cells surrounding the given
+        one, clockwise from north.
+        """
+        lat_index, long_index = self._split(string)
+        lat_bits, long_bits = self._grid_bits(len(string))
+        neighbors = []
+        for lat_delta, long_delta in ((1, 0), (1, 1), (0, 1), (-1, 1),
+                                      (-1, 0), (-1, -1), (0, -1), (1, -1)):
+            if 0 <= lat_index + lat_delta < 1 << lat_bits:
+                neighbors.append(self._join(lat_index + lat_delta,
+                                            long_index + long_delta,
+                                            len(string)))
+        return neighbors
+
+    def cover_bbox(self, lat_min, lat_max, long_min, long_max, max_cells=16):
+        """
+        Return the geohashes of the cells overlapping the given box, using
+        the highest precision needing at most max_cells cells. Longitudes
+        may go past +/-180 for boxes crossing the antimeridian.
+        """
+        lat_min, lat_max = max(lat_min, -90.), min(lat_max, 90.)
+        for precision in xrange(self.precision, 0, -1):
+            lat_bits, long_bits = self._grid_bits(precision)
+            lat_start, long_start = self._split(self.encode(
+                lat_min, _wrap(long_min), precision=precision))
+            lat_end, long_end = self._split(self.encode(
+                lat_max, _wrap(long_max), precision=precision))
+            long_end += (_turns(long_max) - _turns(long_min)) << long_bits
+            rows = lat_end - lat_start + 1
+            columns = min(long_end - long_start + 1, 1 << long_bits)
+            if rows * columns <= max_cells or precision == 1:
+                break
+        return [self._join(lat_index, long_start + column, precision)
+                for lat_index in xrange(lat_start, lat_end + 1)
+                for column in xrange(columns)]
+
+    def cover(self, latitude, longitude, radius, max_cells=16):
+        """
+        Return the geohashes of the cells overlapping the circle of the
+        given radius in kilometers around a point, at the highest precision
+        needing at most max_cells cells before dropping the cells of the
+        bounding box of the circle that do not touch the circle.
+        """
+        lat_delta = math.degrees(radius / EARTH_RADIUS)
+        lat_min, lat_max = latitude - lat_delta, latitude + lat_delta
+        if lat_min <= -90 or lat_max >= 90:
+            long_delta = 180.
+        else:
+            long_delta = min(lat_delta / math.cos(math.radians(
+                max(abs(lat_min), abs(lat_max)))), 180.)
+        cells = self.cover_bbox(lat_min, lat_max, longitude - long_delta,
+                                longitude + long_delta, max_cells)
+        return [cell for cell in cells
+                if self._distance_to_cell(latitude, longitude, cell) <= radius]
+
+    def _distance_to_cell(self, latitude, longitude, string):
+        lat_min, lat_max, long_min, long_max = self.bbox(string)
+        long_center = (long_min + long_max) / 2.
+        half_width = (long_max - long_min) / 2.
+        long_offset = _wrap(longitude - long_center)
+        if abs(long_offset) <= half_width:
+            nearest = (max(lat_min, min(latitude, lat_max)), longitude)
+        else:
+            # The nearest point is on the closest meridian side of the cell
+            long_edge = long_center + math.copysign(half_width, long_offset)
+            long_delta = math.radians(abs(long_offset) - half_width)
+            if long_delta < math.pi / 2:
+                nearest_lat = math.degrees(math.atan(
+                    math.tan(math.radians(latitude)) / math.cos(long_delta)))
+            else:
+                nearest_lat = math.copysign(90., latitude)
+            nearest = (max(lat_min, min(nearest_lat, lat_max)),
+                       _wrap(long_edge))
+        return great_circle_km(latitude, longitude, *nearest)
+
+def _wrap(longitude):
+    return (longitude + 180) % 360 - 180
+
+def _turns(longitude):
+    return int(math.floor((longitude + 180) / 360.))
@@ -51,6 +51,8 @@ class Point(object):
     >>> latitude, longitude = p
     
     """
+    __slots__ = ('latitude', 'longitude', 'altitude')
+
     UTIL_PATTERNS = dict(
         FLOAT=r'\d+(?:\.\d+)?',
         DEGREE=format.DEGREE,
@@ -77,6 +79,11 @@ class Point(object):
             (?P<altitude_units>km|m|mi|ft|nm|nmi)))?
         \s*$
     """ % UTIL_PATTERNS, re.X)
+
+    # Strings recently given to from_string, mapped to their coordinates.
+    # Coordinates are stored rather than Points since Points are mutable.
+    PARSED_STRINGS_SIZE = 1024
+    _parsed_strings = {}
     
     def __new__(cls, latitude=None, longitude=None, altitude=None):
         single_arg = longitude is None and altitude is None
@@ -255,6 +262,50 @@ class Point(object):
             23 26m 22s N 23 27m 30s E
             23 26' 22" N 23 27' 30" E
         
+        """
+        try:
+            return cls(*cls._parsed_strings[string])
+        except KeyError:
+            pass
+        coordinates = cls.parse_decimal(string)
+        if coordinates is None:
+            coordinates = cls.parse_string(string)
+        if len(cls._parsed_strings) >= cls.PARSED_STRINGS_SIZE:
+            cls._parsed_strings.clear()
+        cls._parsed_strings[string] = coordinates
+        return cls(*coordinates)
+
+    @classmethod
+    def parse_decimal(cls, string):
+        """
+        Return a (latitude, longitude) tuple from a string made of just two
+        decimal numbers separated by whitespace or a comma, e.g. "41.5 -81.0",
+        or None if the string has any other format. This is much faster than
+        matching POINT_PATTERN.
+        
+        """
+        parts = string.split()
+        if len(parts) == 1:
+            parts = string.split(',')
+        if len(parts) != 2:
+            return None
+        for part in parts:
+            if part.startswith('-'):
+                part = part[1:]
+            whole, dot, fraction = part.partition('.')
+            if not whole.isdigit() or dot and not fraction.isdigit():
+                return None
+        try:
+            return float(parts[0]), float(parts[1])
+        except ValueError:
+            return None
+
+    @classmethod
+    def parse_string(cls, string):
+        """
+        Return a (latitude, longitude, altitude) tuple from a string in any
+        of the formats accepted by from_string.
+        
         """
         match = re.match(cls.POINT_PATTERN, string)
         if match:
@@ -274,7 +325,7 @@ class Point(object):
                 match.group('altitude_distance'),
                 match.group('altitude_units')
             )
-            return cls(latitude, longitude, altitude)
+            return latitude, longitude, altitude
         else:
             raise ValueError(
                 "Failed to create Point instance from string: unknown format."
@@ -0,0 +1,84 @@
+"""
+Distance comparisons which escalate to expensive formulas only when needed.
+
+Comparing two distances rarely needs ellipsoidal accuracy: an equirectangular
+approximation costs a single cosine, and it is enough unless the two
+distances are within its error margin of each other.
+
+>>> engine = TieredDistance('vincenty')
+>>> engine.compare((41.5, -81.0), (41.6, -81.2), (41.5, -81.0), (41.5, -80.0))
+-1
+>>> engine.escalations
+0
+
+"""
+import math
+from geopy.distance import EARTH_RADIUS, great_circle_km, vincenty_km_memo
+
+PRECISIONS = ('equirectangular', 'great_circle', 'vincenty')
+
+class TieredDistance(object):
+    """
+    Measures and compares distances with the given precision, one of
+    PRECISIONS. Comparisons are first made on equirectangular approximations,
+    and escalate to the formula of the given precision when the two
+    approximations differ by less than `margin` (relative), or when any of
+    them is longer than `max_approximate` kilometers, past which the
+    approximation error grows quickly. approximations and escalations count
+    the comparisons settled by each tier.
+
+    """
+
+    def __init__(self, precision='great_circle', margin=0.01,
+                 max_approximate=100.):
+        if precision not in PRECISIONS:
+            raise ValueError("Unknown precision %r, should be one of %r." %
+                             (precision, PRECISIONS))
+        self.precision = precision
+        self.margin = margin
+        self.max_approximate = max_approximate
+        self.approximations = 0
+        self.escalations = 0
+
+    def approximate(self, lat1, lng1, lat2, lng2):
+        """
+        Return the equirectangular approximation of the distance in
+        kilometers between two points.
+
+        """
+        delta_lng = (lng2 - lng1 + 180) % 360 - 180
+        x = math.radians(delta_lng) * math.cos(math.radians((lat1 + lat2) / 2.))
+        y = math.radians(lat2 - lat1)
+        return EARTH_RADIUS * math.sqrt(x * x + y * y)
+
+    def exact(self, lat1, lng1, lat2, lng2):
+        """
+        Return the distance in kilometers between two points, computed with
+        the formula of the configured precision. Vincenty distances are
+        memoized [See geopy.distance.vincenty_km_memo].
+
+        """
+        if self.precision == 'vincenty':
+            return vincenty_km_memo(lat1, lng1, lat2, lng2)
+        elif self.precision == 'great_circle':
+            return great_circle_km(lat1, lng1, lat2, lng2)
+        return self.approximate(lat1, lng1, lat2, lng2)
+
+    def compare(self, a, b, c, d):
+        """
+        Return -1, 0 or 1 if the distance between the (latitude, longitude)
+        points a and b is less than, equal to or greater than the one between
+        c and d, like cmp() would.
+
+        """
+        first = self.approximate(a[0], a[1], b[0], b[1])
+        second = self.approximate(c[0], c[1], d[0], d[1])
+        if self.precision != 'equirectangular':
+            longest = max(first, second)
+            if (longest > self.max_approximate or
+                abs(first - second) <= self.margin * longest):
+                self.escalations += 1
+                return cmp(self.exact(a[0], a[1], b[0], b[1]),
+                           self.exact(c[0], c[1], d[0], d[1]))
+        self.approximations += 1
+        return cmp(first, second)
@@ -1,9 +1,17 @@
 import re
+import sys
 import logging
+import threading
 import htmlentitydefs
 import xml.dom.minidom
+from StringIO import StringIO
 from xml.parsers.expat import ExpatError
 
+try:
+    from xml.etree import cElementTree as ElementTree
+except ImportError:
+    from xml.etree import ElementTree
+
 try:
     from decimal import Decimal
 except ImportError:
@@ -52,6 +60,117 @@ def get_first_text(node, tag_names, strip=None):
                 child = nodes[0].firstChild
                 return child and child.nodeValue.strip(strip)
 
+def local_name(tag):
+    """Return an ElementTree tag without its namespace."""
+    return tag.rsplit('}', 1)[-1]
+
+def iter_elements(page, tag):
+    """Yield the elements named ``tag`` (ignoring namespaces) of the XML
+    ``page``, a string or a file-like object, as soon as each one is parsed,
+    without building the rest of the document. Parsing stops at malformed
+    XML."""
+    if isinstance(page, unicode):
+        page = page.encode('utf-8')
+    if isinstance(page, str):
+        page = StringIO(page)
+    try:
+        for event, element in ElementTree.iterparse(page):
+            if local_name(element.tag) == tag:
+                yield element
+    except SyntaxError:
+        pass
+
+def find_element(element, tag):
+    """Return the first descendant of ``element`` named ``tag`` (ignoring
+    namespaces), or None."""
+    if element is not None:
+        for child in element.iter():
+            if child is not element and local_name(child.tag) == tag:
+                return child
+
+def get_element_text(element, tag_names, strip=None):
+    """Like get_first_text, for ElementTree elements."""
+    if isinstance(tag_names, basestring):
+        tag_names = [tag_names]
+    for tag_name in tag_names:
+        child = find_element(element, tag_name)
+        if child is not None:
+            return child.text and unicode(child.text).strip(strip)
+
+WHITESPACE = re.compile(r'\s*')
+ITEM_END = re.compile(r'\s*(?:(,)|\])\s*')
+# Pages up to this size are decoded at once by iter_json_items(), which is
+# faster than walking them
+SMALL_JSON_PAGE = 1536
+
+def iter_json_items(page, key, decoder, limit=None):
+    """Yield the items of the array ``key`` of the JSON object ``page``,
+    decoded with ``decoder`` (a JSONDecoder). The members following the
+    array are not decoded, nor are the items past the first ``limit``, which
+    are decoded one at a time when asked for. Without a limit the whole
+    array is decoded at once, which is faster when all of it is needed, and
+    so are pages of at most SMALL_JSON_PAGE characters."""
+    if len(page) <= SMALL_JSON_PAGE:
+        value = decoder.decode(page)
+        if not isinstance(value, dict):
+            raise ValueError("Expected an object as the JSON page")
+        for item in value.get(key, [])[:limit]:
+            yield item
+        return
+
+    def expect(index, chars):
+        char = page[index:index + 1]
+        if not char or char not in chars:
+            raise ValueError("Expected %r at %d of the JSON page" %
+                             (chars, index))
+        return WHITESPACE.match(page, index + 1).end()
+
+    index = expect(WHITESPACE.match(page).end(), '{')
+    while page[index:index + 1] == '"':
+        name, index = decoder.raw_decode(page, idx=index)
+        index = expect(WHITESPACE.match(page, index).end(), ':')
+        if name == key:
+            if limit is None:
+                expect(index, '[')
+                for item in decoder.raw_decode(page, idx=index)[0]:
+                    yield item
+                return
+            index = expect(index, '[')
+            if page[index:index + 1] == ']':
+                return
+            for count in xrange(limit):
+                item, index = decoder.raw_decode(page, idx=index)
+                yield item
+                match = ITEM_END.match(page, index)
+                if match is None:
+                    expect(index, ',]')
+                if not match.group(1):
+                    return
+                index = match.end()
+            return
+        value, index = decoder.raw_decode(page, idx=index)
+        index = WHITESPACE.match(page, index).end()
+        if page[index:index + 1] == ',':
+            index = WHITESPACE.match(page, index + 1).end()
+
+def get_one(items, name, strict=True):
+    """Return the first of ``items``. If ``strict``, a second one is read
+    to check that there is exactly one, and ValueError is raised otherwise;
+    no more items are read in any case. Without ``strict``, IndexError is
+    raised if there are no items, as indexing a list of them would."""
+    items = iter(items)
+    for first in items:
+        break
+    else:
+        if not strict:
+            raise IndexError("No %s found." % name)
+        raise ValueError("Didn't find exactly one %s! (Found 0.)" % name)
+    if strict:
+        for second in items:
+            raise ValueError("Didn't find exactly one %s! "
+                             "(Found more than one.)" % name)
+    return first
+
 def join_filter(sep, seq, pred=bool):
     return sep.join([unicode(i) for i in seq if pred(i)])
 
@@ -99,3 +218,67 @@ class RichResult(tuple):
         for name, value in kwargs.items():
             setattr(obj, name, value)
         return obj
+
+class LRUMemo(object):
+    """
+    Wraps a function, remembering the results of about the last max_entries
+    distinct calls. Calls are told apart by key(*args, **kwargs), or by their
+    positional arguments if no key function is given. hits and misses count
+    the calls answered from memory and the ones computed.
+
+    Recency is tracked with two generations of plain dictionaries rather
+    than an ordered one: results used since the current generation started
+    survive the next switch, the others are dropped with the old generation.
+
+    """
+    def __init__(self, function, max_entries=4096, key=None):
+        self.function = function
+        self.max_entries = max_entries
+        self.key = key
+        self.recent = {}
+        self.old = {}
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, *args, **kwargs):
+        if self.key is None:
+            key = args
+        else:
+            key = self.key(*args, **kwargs)
+        try:
+            result = self.recent[key]
+        except KeyError:
+            try:
+                result = self.old[key]
+            except KeyError:
+                self.misses += 1
+                result = self.function(*args, **kwargs)
+            else:
+                self.hits += 1
+            self._store(key, result)
+        else:
+            self.hits += 1
+        return result
+
+    def _store(self, key, result):
+        self.lock.acquire()
+        try:
+            if len(self.recent) >= self.max_entries // 2:
+                self.old = self.recent
+                self.recent = {}
+            self.recent[key] = result
+        finally:
+            self.lock.release()
+
+    def clear(self):
+        self.lock.acquire()
+        try:
+            self.recent = {}
+            self.old = {}
+            self.hits = self.misses = 0
+        finally:
+            self.lock.release()
+
+    def __len__(self):
+        return len(self.recent) + len(self.old)
@@ -0,0 +1,62 @@
+"""
+Distance functions working on whole arrays of coordinates at once.
+
+This module requires NumPy. All the functions accept scalars, sequences or
+NumPy arrays of latitudes and longitudes in degrees, which are broadcast
+against each other, and return a NumPy array.
+
+>>> distances = great_circle([41.5, 42.0], [-81.0, -81.0], 41.5, -80.0)
+>>> [round(d, 1) for d in distances]
+[83.3, 99.9]
+
+>>> latitudes, longitudes = destination(41.5, -81.0, [0, 90], 10)
+>>> [round(l, 4) for l in latitudes], [round(l, 4) for l in longitudes]
+([41.5899, 41.4999], [-81.0, -80.88])
+
+"""
+import numpy
+from geopy.distance import EARTH_RADIUS
+
+def great_circle(lat1, lng1, lat2, lng2, radius=EARTH_RADIUS):
+    """
+    Return the great-circle distances in kilometers between the points
+    (lat1, lng1) and the points (lat2, lng2), using the haversine formula on
+    a sphere with the given radius in kilometers.
+
+    """
+    lat1, lng1 = numpy.radians(lat1), numpy.radians(lng1)
+    lat2, lng2 = numpy.radians(lat2), numpy.radians(lng2)
+
+    sin_half_delta_lat = numpy.sin((lat2 - lat1) / 2.)
+    sin_half_delta_lng = numpy.sin((lng2 - lng1) / 2.)
+
+    a = (sin_half_delta_lat ** 2 +
+         numpy.cos(lat1) * numpy.cos(lat2) * sin_half_delta_lng ** 2)
+
+    # Rounding can push `a` slightly out of [0, 1] for (nearly) antipodal
+    # points.
+    return 2 * radius * numpy.arcsin(numpy.sqrt(numpy.clip(a, 0., 1.)))
+
+def destination(lat, lng, bearing, distance, radius=EARTH_RADIUS):
+    """
+    Return the (latitudes, longitudes) arrays of the points reached going
+    from the points (lat, lng) along the initial bearings in degrees for the
+    distances in kilometers, like GreatCircleDistance.destination does for a
+    single point. Longitudes are normalized to [-180, 180).
+
+    """
+    lat1, lng1 = numpy.radians(lat), numpy.radians(lng)
+    bearing = numpy.radians(bearing)
+    angle = numpy.asarray(distance, dtype=float) / radius
+
+    sin_lat1, cos_lat1 = numpy.sin(lat1), numpy.cos(lat1)
+    sin_angle, cos_angle = numpy.sin(angle), numpy.cos(angle)
+
+    lat2 = numpy.arcsin(numpy.clip(
+        sin_lat1 * cos_angle + cos_lat1 * sin_angle * numpy.cos(bearing),
+        -1., 1.))
+    lng2 = lng1 + numpy.arctan2(numpy.sin(bearing) * sin_angle * cos_lat1,
+                                cos_angle - sin_lat1 * numpy.sin(lat2))
+
+    lng2 = (numpy.degrees(lng2) + 180.) % 360. - 180.
+    return numpy.degrees(lat2), lng2
@@ -25,7 +25,7 @@ import rest.utils
 class SearchHandler(piston.handler.BaseHandler):
     allowed_methods = ['GET','POST']
     model = server.models.Search
-    fields = ("href","origin","destination",("author",("fake","username","href")),("trips",('href', 'published', 'updated', 'expires', 
+    fields = ("href","origin","destination",("author",("fake","username","href")),("proposed_trip",("href",)),("trips",('href', 'published', 'updated', 'expires', 
               ('author',('username','gender','href')), 
               'locations',
               'modality',
@@ -38,7 +38,7 @@ class SearchHandler(piston.handler.BaseHandler):
             return piston.utils.rc.NOT_FOUND
         try:
             search = server.models.Search.objects.get(id=id)
-            result = server.passenger.searchRide(search.origin, search.destination, user)
+            result = server.passenger.searchRide(search.origin, search.destination, user, search)
             search.trips = result.value
             return search
         except server.models.Search.DoesNotExist:
@@ -0,0 +1,163 @@
+"""
+   Copyright 2010 Daniel Graziotin <daniel.graziotin@acm.org>
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+"""
+This module retrieves in the background the address details of the
+Locations saved with just a GeoRSS point, so that saving a position does
+not wait for the geocoder [See Location.complete_fields()]
+"""
+import Queue
+import django.db
+import geopy.point
+import itertools
+import logging
+import models
+import settings
+import threading
+
+def backfill(location_ids=None):
+    """
+    Retrieves the address details of the Locations with address_pending, by
+    default all of them, and stores them. Addresses are retrieved
+    settings.GEOCODER_WORKERS at a time [See Geocoder.reverse_many()]. A
+    Location is completed by any answer of the geocoder, even one without a
+    street (e.g. the town of the offline geocoder); the Locations whose
+    lookup failed stay pending. Returns the number of Locations completed.
+    """
+    locations = models.Location.objects.filter(address_pending=True)
+    if location_ids is not None:
+        locations = locations.filter(id__in=list(location_ids))
+
+    locations = list(locations)
+    points = [geopy.point.Point.from_string(location.georss_point)
+              for location in locations]
+    results = models.location.get_geocoder().reverse_many(
+        [(point.latitude, point.longitude) for point in points],
+        workers=settings.GEOCODER_WORKERS)
+
+    completed = 0
+    for location, result in itertools.izip(locations, results):
+        if isinstance(result, Exception):
+            continue
+        location.set_address(result)
+        # update() rather than save(): the Location may have changed since
+        # it was read, and saving it would complete its fields again
+        completed += models.Location.objects.filter(
+            id=location.id,
+            georss_point=location.georss_point,
+            address_pending=True,
+        ).update(street=location.street,
+                 town=location.town,
+                 postcode=location.postcode,
+                 address_pending=False)
+    return completed
+
+
+class Backfiller(object):
+    """
+    A pool of worker threads running backfill() on the ids of the Locations
+    given to schedule(), batch_size ids at a time. Workers are started on
+    the first schedule(). The Locations still pending after a backfill() are
+    queued again after retry_delay seconds, doubled at each attempt, up to
+    retries attempts; the ones left are completed by
+    manage.py backfilladdresses.
+    """
+
+    def __init__(self, workers=2, batch_size=20, retries=5, retry_delay=60):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.queue = Queue.Queue()
+        self.threads = []
+        self.attempts = {}
+        self.lock = threading.Lock()
+
+    def schedule(self, location_id):
+        """
+        Queues a Location for backfill()
+        """
+        if not self.threads:
+            self.start()
+        self.queue.put(location_id)
+
+    def start(self):
+        self.lock.acquire()
+        try:
+            while len(self.threads) < self.workers:
+                thread = threading.Thread(target=self.run)
+                thread.setDaemon(True)
+                thread.start()
+                self.threads.append(thread)
+        finally:
+            self.lock.release()
+
+    def run(self):
+        while True:
+            location_ids = [self.queue.get()]
+            while len(location_ids) < self.batch_size:
+                try:
+                    location_ids.append(self.queue.get_nowait())
+                except Queue.Empty:
+                    break
+            try:
+                backfill(location_ids)
+                pending = list(models.Location.objects.filter(
+                    id__in=location_ids, address_pending=True,
+                ).values_list('id', flat=True))
+                self.retry(location_ids, pending)
+            except Exception:
+                logging.getLogger(__name__).exception(
+                    "Could not backfill Locations %r", location_ids)
+                self.retry(location_ids, location_ids)
+            finally:
+                # Each thread has its own database connection
+                django.db.connection.close()
+
+    def retry(self, location_ids, pending):
+        """
+        Queues again the pending ones among location_ids, with backoff
+        """
+        pending = set(pending)
+        self.lock.acquire()
+        try:
+            for location_id in location_ids:
+                attempts = self.attempts.pop(location_id, 0) + 1
+                if location_id not in pending:
+                    continue
+                if attempts > self.retries:
+                    logging.getLogger(__name__).warning(
+                        "Giving up on the address of Location %r",
+                        location_id)
+                    continue
+                self.attempts[location_id] = attempts
+                timer = threading.Timer(
+                    self.retry_delay * 2 ** (attempts - 1),
+                    self.queue.put, [location_id])
+                timer.setDaemon(True)
+                timer.start()
+        finally:
+            self.lock.release()
+
+backfiller = Backfiller(settings.GEOCODER_WORKERS,
+                        retries=settings.GEOCODER_RETRIES,
+                        retry_delay=settings.GEOCODER_RETRY_DELAY)
+
+def schedule(location_id):
+    """
+    Retrieves in the background the address details of a Location
+    """
+    backfiller.schedule(location_id)
@@ -0,0 +1,92 @@
+"""
+   Copyright 2010 Daniel Graziotin <daniel.graziotin@acm.org>
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+"""
+This module holds a small process-local cache used by the matching Algorithm
+of Dycapo
+"""
+import collections
+import threading
+import time
+
+class ExpiringLRUCache(object):
+    """
+    A dictionary-like cache holding at most max_entries values, each for at
+    most ttl seconds. When full, the least recently used value is evicted.
+    """
+
+    def __init__(self, max_entries=1000, ttl=10):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Returns the value stored under key, or None if missing or expired
+        """
+        self.lock.acquire()
+        try:
+            entry = self.entries.pop(key, None)
+            if entry is None or entry[0] < time.time():
+                self.misses += 1
+                return None
+            self.entries[key] = entry
+            self.hits += 1
+            return entry[1]
+        finally:
+            self.lock.release()
+
+    def set(self, key, value):
+        """
+        Stores a value under key, evicting the least recently used one if
+        the cache is full
+        """
+        self.lock.acquire()
+        try:
+            self.entries.pop(key, None)
+            self.entries[key] = (time.time() + self.ttl, value)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        finally:
+            self.lock.release()
+
+    def invalidate(self, predicate):
+        """
+        Removes all the values for which predicate(value) is True
+        """
+        self.lock.acquire()
+        try:
+            for key in [key for key, entry in self.entries.iteritems()
+                        if predicate(entry[1])]:
+                del self.entries[key]
+        finally:
+            self.lock.release()
+
+    def clear(self):
+        """
+        Removes all the values
+        """
+        self.lock.acquire()
+        try:
+            self.entries.clear()
+        finally:
+            self.lock.release()
+
+    def __len__(self):
+        return len(self.entries)
@@ -17,6 +17,7 @@
 """ This module holds all the methods that a driver
 and a passenger have in common """
 
+import matching
 import models
 import utils
 import django.contrib.auth.models
@@ -44,6 +45,7 @@ def setPosition(current_user, position):
     current_user.location_id = position.id
     current_user.locations.add(position)
 
+    participation = None
     if current_user.is_participating():
         try:
                 participation = current_user.get_active_participation()
@@ -52,6 +54,7 @@ def setPosition(current_user, position):
                 pass
 
     current_user.save()
+    matching.track_position(current_user, position, participation)
 
     resp = models.Response(models.Response.CREATED,
                            "Location", position)
@@ -17,6 +17,7 @@
 """This module holds all the methods that a Driver needs."""
 
 import datetime
+import matching
 import models
 import utils
 import django.core.exceptions
@@ -69,6 +70,7 @@ def insertTrip(trip, author, source, destination, modality, preferences):
     participation = models.Participation(author=author, trip=trip,
                                          role='driver')
     participation.save()
+    matching.index_trip(trip, [source, destination])
 
     resp = models.Response(models.Response.CREATED,
                            "Trip",
@@ -102,6 +104,7 @@ def startTrip(trip, driver):
     participation.save()
     trip.active = True
     trip.save()
+    matching.index_trip(trip)
 
     resp = models.Response(models.Response.ALL_OK,
                            "Trip", trip)
@@ -203,6 +206,8 @@ def finishTrip(trip, driver):
         participation.save()
     trip.active = False
     trip.save()
+    matching.unindex_trip(trip)
+    matching.forget_track(driver)
 
     resp = models.Response(models.Response.DELETED,
                            "Message", models.Response.TRIP_DELETED)
@@ -0,0 +1,29 @@
+"""
+   Copyright 2010 Daniel Graziotin <daniel.graziotin@acm.org>
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+"""
+Retrieves the address details of all the Locations still waiting for them,
+e.g. the ones left pending by a restart of the server
+"""
+import server.backfill
+from django.core.management.base import BaseCommand
+
+class Command(BaseCommand):
+    args = ''
+    help = 'Retrieves the address details of the Locations saved without them'
+
+    def handle(self, *args, **options):
+        completed = server.backfill.backfill()
+        print "%d locations completed" % completed
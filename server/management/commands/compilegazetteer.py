@@ -0,0 +1,35 @@
+"""
+   Copyright 2010 Daniel Graziotin <daniel.graziotin@acm.org>
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+"""
+Compiles a GeoNames dump into the table of places of the 'offline' geocoder,
+settings.GEOCODER_GAZETTEER
+"""
+import geopy.geocoders.offline
+import settings
+from django.core.management.base import BaseCommand, CommandError
+
+class Command(BaseCommand):
+    args = '<geonames dump> [minimum population]'
+    help = 'Compiles a GeoNames dump (e.g. cities1000.txt) for the offline geocoder'
+
+    def handle(self, *args, **options):
+        if not args:
+            raise CommandError("Give the path of a GeoNames dump")
+        min_population = len(args) > 1 and int(args[1]) or 0
+        count = geopy.geocoders.offline.compile_gazetteer(
+            args[0], settings.GEOCODER_GAZETTEER, min_population)
+        print "%d places compiled into %s" % (count,
+                                             settings.GEOCODER_GAZETTEER)
@@ -0,0 +1,44 @@
+"""
+   Copyright 2010 Daniel Graziotin <daniel.graziotin@acm.org>
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+"""
+Computes the geohash of the Locations stored before it was introduced. The
+rows are updated directly: saving them again would complete their fields
+and call the geocoder
+"""
+import geopy.geohash
+import geopy.point
+import server.models
+from django.core.management.base import BaseCommand
+
+class Command(BaseCommand):
+    args = ''
+    help = 'Computes the geohash of the Locations lacking it'
+
+    def handle(self, *args, **options):
+        geohash = geopy.geohash.Geohash()
+        locations = server.models.Location.objects.filter(geohash='')
+        rows = locations.values_list('id', 'georss_point',
+                                     'georss_point_latitude',
+                                     'georss_point_longitude')
+        filled = 0
+        for location_id, georss_point, latitude, longitude in rows.iterator():
+            if georss_point:
+                point = geopy.point.Point.from_string(georss_point)
+                latitude, longitude = point.latitude, point.longitude
+            filled += server.models.Location.objects.filter(
+                id=location_id, geohash='').update(
+                    geohash=geohash.encode(latitude, longitude))
+        print "%d locations updated" % filled
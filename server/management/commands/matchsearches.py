@@ -0,0 +1,30 @@
+"""
+   Copyright 2010 Daniel Graziotin <daniel.graziotin@acm.org>
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+"""
+Matches all the open searches to active trips in a single pass. Meant to be
+run periodically, e.g. from cron
+"""
+import server.matching
+from django.core.management.base import BaseCommand
+
+class Command(BaseCommand):
+    args = ''
+    help = 'Proposes an active trip to each open search, respecting the seats available'
+
+    def handle(self, *args, **options):
+        searches = server.matching.get_open_searches()
+        assignment = server.matching.assign_searches(searches)
+        print "%d searches, %d matched" % (len(searches), len(assignment))
@@ -17,72 +17,784 @@
 """
 This module holds all the functions involved in the matching Algorithm of Dycapo
 """
+import datetime
+import cache
+import django.db
+import django.db.models
+import django.db.models.signals
+import geopy.geohash
+import geopy.tiered
+import heapq
 import models
+import settings
+import spatial
+import time
+import tracking
+
+try:
+    import geopy.vectorized as vectorized
+except ImportError:
+    # NumPy is not available, distances are computed one by one
+    vectorized = None
+
+active_trip_destinations = spatial.GridIndex()
+active_trip_routes = spatial.CorridorIndex()
+standing_searches = spatial.BoxIndex()
+candidate_cache = cache.ExpiringLRUCache(settings.MATCHING_CACHE_SIZE,
+                                         settings.MATCHING_CACHE_TTL)
+cell_geohash = geopy.geohash.Geohash()
+distance_engine = geopy.tiered.TieredDistance(
+    settings.MATCHING_DISTANCE_PRECISION)
+person_tracks = tracking.Tracker()
+
+# Speed in km/h assumed for a driver whose Track gives no better estimate
+DEFAULT_DRIVER_SPEED = 30.0
+
+# Weights of the cost of a Trip for a rider, see get_trip_cost()
+DETOUR_WEIGHT = 1.0             # per KM of detour of the driver
+PICKUP_WEIGHT = 0.2             # per minute the rider waits for the driver
+VACANCY_WEIGHT = 0.1            # per empty seat
+PROXIMITY_WEIGHT = 0.1          # per point of proximity factor
+
+def get_destination_index():
+    """
+    Returns the index of the destinations of all active Trips, reloading it
+    from the database if it is older than settings.MATCHING_INDEX_REFRESH
+    """
+    if active_trip_destinations.is_stale(settings.MATCHING_INDEX_REFRESH):
+        destinations = models.Location.objects.filter(
+            point='dest',
+            trip__active=True,
+        ).values_list('trip__id', 'georss_point_latitude',
+                      'georss_point_longitude')
+        active_trip_destinations.load(destinations)
+    return active_trip_destinations
+
+def get_corridor_index():
+    """
+    Returns the index of the routes of all active Trips still to be driven,
+    reloading it from the database if it is older than
+    settings.MATCHING_INDEX_REFRESH
+    """
+    if active_trip_routes.is_stale(settings.MATCHING_INDEX_REFRESH):
+        locations = models.Location.objects.filter(
+            point__in=('orig', 'wayp', 'dest'),
+            trip__active=True,
+        ).order_by('id').values_list('trip__id', 'point',
+                                     'georss_point_latitude',
+                                     'georss_point_longitude')
+        trip_locations = {}
+        for trip_id, point, latitude, longitude in locations:
+            trip_locations.setdefault(trip_id, []).append(
+                                            (point, latitude, longitude))
+        active_trip_routes.load([(trip_id, get_route(points))
+                                 for trip_id, points
+                                 in trip_locations.iteritems()])
+
+        positions = models.Trip.objects.filter(
+            active=True,
+            author__location__isnull=False,
+        ).values_list('id', 'author__location__georss_point_latitude',
+                      'author__location__georss_point_longitude')
+        for trip_id, latitude, longitude in positions:
+            advance_route(trip_id, latitude, longitude)
+    return active_trip_routes
+
+def advance_route(trip_id, latitude, longitude):
+    """
+    Advances the route of a Trip to a position of its driver, unless the
+    position is off the route by more than settings.MATCHING_CORRIDOR_WIDTH
+    [See spatial.CorridorIndex.advance()]
+    """
+    active_trip_routes.advance(trip_id, latitude, longitude,
+                               settings.MATCHING_CORRIDOR_WIDTH / 1000.0)
+
+def get_route(points):
+    """
+    Given a list of (point, latitude, longitude) tuples of the Locations of a
+    Trip, where point is the Location attribute, returns the planned route
+    as a list of (latitude, longitude): origin, waypoints, destination.
+    """
+    order = {'orig': 0, 'wayp': 1, 'dest': 2}
+    points = sorted(points, key=lambda point: order[point[0]])
+    return [(latitude, longitude) for point, latitude, longitude in points]
+
+def index_trip(trip, locations=None):
+    """
+    Adds the destination and the route of an active Trip to the indexes of
+    active Trips, and to the candidates of the standing Searches with a
+    destination near the one of the Trip
+    """
+    if not trip.active:
+        return
+    if not locations:
+        locations = trip.locations.filter(
+            point__in=('orig', 'wayp', 'dest')).order_by('id')
+    points = [(location.point, location.georss_point_latitude,
+               location.georss_point_longitude)
+              for location in locations]
+    route = get_route(points)
+    active_trip_destinations.add(trip.id, *route[-1])
+    invalidate_candidates(*route[-1])
+    standing_searches.add_match(route[-1][0], route[-1][1], trip.id)
+    active_trip_routes.set_route(trip.id, route)
+    driver_location = trip.author.location
+    if driver_location:
+        advance_route(trip.id, driver_location.georss_point_latitude,
+                      driver_location.georss_point_longitude)
+
+def unindex_trip(trip):
+    """
+    Removes a Trip from the indexes of active Trips and from the candidates
+    of the standing Searches
+    """
+    destination = active_trip_destinations.get(trip.id)
+    if destination:
+        invalidate_candidates(*destination)
+    active_trip_destinations.remove(trip.id)
+    active_trip_routes.remove(trip.id)
+    standing_searches.remove_match(trip.id)
+
+def track_position(person, location, participation=None):
+    """
+    Adds a new position of a Person to its Track. If the Person is driving,
+    the route of the Trip is advanced to the new position.
+    """
+    person_tracks.update(person.id, location)
+    if participation and participation.role == 'driver':
+        advance_route(participation.trip_id, location.georss_point_latitude,
+                      location.georss_point_longitude)
+
+def forget_track(person):
+    """
+    Drops the Track of a Person, e.g. when the Trip or the ride finishes
+    """
+    person_tracks.remove(person.id)
+
+def get_fresh_track(person):
+    """
+    Returns the Track of a Person if it is up to date with the current
+    position of the Person, None otherwise
+    """
+    if not person.location_id:
+        return None
+    return person_tracks.get(person.id, person.location_id)
 
 def search_ride(location,rider):
     """
-    Returns all the Trips with a destination near a given location.
-    Here we create a virtual box around the destination.
-    [See Location.get_box_around()]
-    We query the database for all active Trips with a destination that is inside
-    this box, and return the QuerySet
+    Returns the Trips suitable for a rider going to a given location: the
+    candidates found by find_candidates() are evaluated with
+    evaluate_trips(). At most settings.MATCHING_MAX_RESULTS Trips are
+    returned, best first.
+    """
+    destinations = find_candidates(location, rider.location)
+    return evaluate_trips(destinations, rider.location,
+                          settings.MATCHING_MAX_RESULTS)
+
+
+def search_standing(search, rider):
+    """
+    Like search_ride(), for a Search that is read over and over: its
+    candidates are not looked for again at each read, but kept up to date
+    as Trips start and finish [See get_standing_candidates()]. Only the
+    evaluation of the candidates is performed.
+    """
+    if not settings.MATCHING_SPATIAL_INDEX:
+        return search_ride(search.destination, rider)
+    trip_ids = get_standing_candidates(search)
+    destinations = {}
+    for trip_id in trip_ids:
+        destination = active_trip_destinations.get(trip_id)
+        if destination is None:
+            route = active_trip_routes.get_route(trip_id)
+            destination = route and route[-1]
+        if destination:
+            destinations[trip_id] = destination
+    return evaluate_trips(destinations, rider.location,
+                          settings.MATCHING_MAX_RESULTS)
+
+
+def get_standing_candidates(search):
+    """
+    Returns the ids of the candidate Trips of a standing Search. They are
+    computed by find_candidates() the first time and again when older than
+    settings.MATCHING_INDEX_REFRESH, to see the Trips started by other
+    processes. In between, index_trip() and unindex_trip() keep them up to
+    date.
+    """
+    standing = standing_searches.get(search.id)
+    if standing is not None:
+        trip_ids, timestamp = standing
+        if time.time() - timestamp <= settings.MATCHING_INDEX_REFRESH:
+            return trip_ids
+
+    standing_searches.expire(settings.MATCHING_SEARCH_LIFETIME * 60)
+    destinations = find_candidates(search.destination, search.origin)
+    standing_searches.set(search.id, search.destination.get_bounds_around(),
+                          destinations.keys())
+    return set(destinations.keys())
+
+
+def find_candidates(destination, origin, bounds=None):
+    """
+    Returns a dictionary trip id -> (latitude, longitude) of the destination
+    of the active Trips that may suit a rider going from origin to
+    destination: the ones with a destination near the given one
+    [See find_destination_candidates()], and the ones passing by both the
+    origin and the destination [See search_corridors()]
+    """
+    destinations = find_destination_candidates(destination, bounds)
+
+    if settings.MATCHING_CORRIDOR_WIDTH:
+        destinations.update(search_corridors(origin, destination))
+
+    return destinations
+
+
+def find_destination_candidates(destination, bounds=None):
+    """
+    Returns a dictionary trip id -> (latitude, longitude) of the destination
+    of the active Trips with vacancy and a destination near the given one.
+    Here we create a virtual box around the destination, unless given in
+    bounds. [See Location.get_bounds_around()]
+    The candidates of all the destinations falling in the same geohash cell,
+    with the same offset, are looked for once: they are cached for
+    settings.MATCHING_CACHE_TTL seconds, or until a Trip with a destination
+    near the cell starts, finishes or changes vacancy.
+    """
+    if bounds is None:
+        bounds = destination.get_bounds_around()
+    if not settings.MATCHING_CACHE_SIZE:
+        return get_destinations_inside(bounds)
+
+    latitude = destination.georss_point_latitude
+    longitude = destination.georss_point_longitude
+    cell = cell_geohash.encode(latitude, longitude,
+                               precision=settings.MATCHING_CACHE_PRECISION)
+    key = (cell, destination.offset)
+    cached = candidate_cache.get(key)
+    if cached is None:
+        # The box around any destination in the cell is inside cell_bounds
+        lat_min, lat_max, lon_min, lon_max = bounds
+        cell_lat_min, cell_lat_max, cell_lon_min, cell_lon_max = \
+            cell_geohash.bbox(cell)
+        cell_bounds = (cell_lat_min - (latitude - lat_min),
+                       cell_lat_max + (lat_max - latitude),
+                       cell_lon_min - (longitude - lon_min),
+                       cell_lon_max + (lon_max - longitude))
+        destinations = get_destinations_inside(cell_bounds)
+        vacancies = get_vacancies_by_id(destinations.keys())
+        destinations = dict([(trip_id, point)
+                             for trip_id, point in destinations.iteritems()
+                             if vacancies.get(trip_id, 0) > 0])
+        cached = (cell_bounds, destinations)
+        candidate_cache.set(key, cached)
+
+    return dict([(trip_id, point) for trip_id, point in cached[1].iteritems()
+                 if is_inside(point, bounds)])
+
+
+def get_destinations_inside(bounds):
+    """
+    Returns a dictionary trip id -> (latitude, longitude) of the destination
+    of the active Trips with a destination inside the given (lat_min,
+    lat_max, lon_min, lon_max) box
     """
+    lat_min, lat_max, lon_min, lon_max = bounds
+
+    if settings.MATCHING_SPATIAL_INDEX:
+        return get_destination_index().search(lat_min, lat_max,
+                                              lon_min, lon_max)
+
+    prefixes = django.db.models.Q()
+    for prefix in spatial.get_geohash_prefixes(*bounds):
+        prefixes |= django.db.models.Q(geohash__startswith=prefix)
 
-    box_around_location = location.get_box_around()
-    lat_max = max((box_around_location[0].georss_point_latitude,
-                   box_around_location[1].georss_point_latitude))
-    lat_min = min((box_around_location[3].georss_point_latitude,
-                   box_around_location[2].georss_point_latitude))
+    destinations = models.Location.objects.filter(
+        prefixes,
+        point='dest',
+        trip__active=True,
+        georss_point_latitude__range=(lat_min, lat_max),
+        georss_point_longitude__range=(lon_min, lon_max),
+    ).values_list('trip__id', 'georss_point_latitude',
+                  'georss_point_longitude')
+    return dict([(trip_id, (latitude, longitude))
+                 for trip_id, latitude, longitude in destinations])
 
-    lon_max = max((box_around_location[1].georss_point_longitude,
-                   box_around_location[2].georss_point_longitude))
-    lon_min = min((box_around_location[0].georss_point_longitude,
-                   box_around_location[3].georss_point_longitude))
 
-    trips = models.Trip.objects.filter(
+def is_inside(point, bounds):
+    """
+    Returns True if a (latitude, longitude) tuple lies inside a (lat_min,
+    lat_max, lon_min, lon_max) box
+    """
+    lat_min, lat_max, lon_min, lon_max = bounds
+    return (lat_min <= point[0] <= lat_max and
+            lon_min <= point[1] <= lon_max)
+
+
+def invalidate_candidates(latitude, longitude):
+    """
+    Removes from the cache of find_destination_candidates() all the entries
+    a Trip with the given destination could belong to
+    """
+    candidate_cache.invalidate(
+        lambda cached: is_inside((latitude, longitude), cached[0]))
+
+
+def modality_saved(sender, instance, **kwargs):
+    """
+    Invalidates the cached candidates near the destinations of the active
+    Trips of a Modality, whose vacancy may have changed
+    """
+    trip_ids = models.Trip.objects.filter(
+        modality=instance,
         active=True,
-        locations__point='dest',
-        locations__georss_point_latitude__range=(lat_min, lat_max),
-        locations__georss_point_longitude__range=(lon_min, lon_max),
-    ).only("id","author","locations")
+    ).values_list('id', flat=True)
+    for trip_id in trip_ids:
+        destination = active_trip_destinations.get(trip_id)
+        if destination:
+            invalidate_candidates(*destination)
 
-    for trip in trips:
+django.db.models.signals.post_save.connect(
+    modality_saved,
+    sender=models.Modality,
+    dispatch_uid='server.matching.modality_saved')
 
-        if not trip.has_vacancy():
-            trips = trips.exclude(id=trip.id)
-            break
 
-        destination = trip.get_destination()
-        rider_distance_from_destination = rider.location.distance(destination)
+def search_corridors(origin, destination):
+    """
+    Returns a dictionary trip id -> (latitude, longitude) of the destination
+    of the active Trips whose route still to be driven passes within
+    settings.MATCHING_CORRIDOR_WIDTH meters of the origin and then of the
+    destination.
+    """
+    if not origin:
+        return {}
+    width = settings.MATCHING_CORRIDOR_WIDTH / 1000.0
+    index = get_corridor_index()
+    near_origin = index.search(origin.georss_point_latitude,
+                               origin.georss_point_longitude, width)
+    if not near_origin:
+        return {}
+    near_destination = index.search(destination.georss_point_latitude,
+                                    destination.georss_point_longitude, width)
 
-        driver_distance_from_destination = trip.author.location.distance(
-            destination)
+    found = {}
+    for trip_id, (distance, along) in near_origin.iteritems():
+        if trip_id in near_destination and \
+           near_destination[trip_id][1] >= along:
+            route = index.get_route(trip_id)
+            if route:
+                found[trip_id] = route[-1]
+    return found
 
-        if driver_distance_from_destination < rider_distance_from_destination:
-            trips = trips.exclude(id=trip.id)
-            break
 
-        if get_proximity_factor(trip.author, rider.location) < -2:
-            trips = trips.exclude(id=trip.id)
-            break
+def evaluate_trips(destinations, position, max_results=None):
+    """
+    Given a dictionary trip id -> (latitude, longitude) of candidate Trip
+    destinations and the position of the rider, returns the list of Trips
+    suitable for the rider, ordered by get_trip_cost() and truncated to the
+    best max_results ones. [See load_candidates() and score_trips()]
+    """
+    if not destinations or not position:
+        return []
+    trips = load_candidates(destinations.keys())
+    return [trip for cost, trip
+            in score_trips(trips, destinations, position, max_results)]
+
+
+def load_candidates(trip_ids):
+    """
+    Returns the active Trips among the given ones that have vacancy and
+    whose driver has a known position. Each Trip is given the attributes
+    available_seats, driver_fresh_track, the up to date Track of the driver
+    if any, driver_track, the recent (latitude, longitude) of the driver
+    otherwise, and driver_speed, in km/h or None if unknown.
+    Everything is fetched in a fixed number of queries, whatever the number
+    of Trips.
+    """
+    if not trip_ids:
+        return []
 
+    trips = list(models.Trip.objects.filter(
+        active=True,
+        id__in=list(trip_ids),
+    ).select_related('author__location', 'modality'))
+
+    vacancies = get_vacancies(trips)
+    trips = [trip for trip in trips
+             if vacancies[trip.id] > 0 and trip.author.location]
+
+    fresh_tracks = {}
+    for trip in trips:
+        track = get_fresh_track(trip.author)
+        if track:
+            fresh_tracks[trip.author_id] = track
+    tracks = get_recent_tracks([trip.author_id for trip in trips
+                                if trip.author_id not in fresh_tracks])
+
+    for trip in trips:
+        trip.available_seats = vacancies[trip.id]
+        trip.driver_fresh_track = fresh_tracks.get(trip.author_id)
+        trip.driver_track = tracks.get(trip.author_id, [])
+        trip.driver_speed = None
+        if trip.driver_fresh_track:
+            trip.driver_speed = trip.driver_fresh_track.get_speed()
     return trips
 
 
+def score_trips(trips, destinations, position, max_results=None):
+    """
+    Given Trips returned by load_candidates(), a dictionary trip id ->
+    (latitude, longitude) of their destinations and the position of the
+    rider, returns a list of (cost, Trip) of the Trips suitable for the
+    rider, ordered by get_trip_cost() and truncated to the best max_results
+    ones. Trips missing from destinations are ignored.
+    A Trip is excluded if its driver is closer to the destination than the
+    rider or if the driver is getting away from the rider.
+    """
+    trips = [trip for trip in trips if trip.id in destinations]
+    rider_point = (position.georss_point_latitude,
+                   position.georss_point_longitude)
+
+    # Cheap comparisons first: exact distances are only computed for the
+    # Trips passing them [See geopy.tiered]
+    candidates = []
+    for trip in trips:
+        destination_point = destinations[trip.id]
+        driver_point = (trip.author.location.georss_point_latitude,
+                        trip.author.location.georss_point_longitude)
+        if distance_engine.compare(driver_point, destination_point,
+                                   rider_point, destination_point) < 0:
+            continue
+        if trip.driver_fresh_track:
+            proximity_factor = trip.driver_fresh_track.get_proximity_factor(
+                *rider_point)
+        else:
+            proximity_factor = get_track_proximity_factor(trip.driver_track,
+                                                          rider_point)
+        if proximity_factor < -2:
+            continue
+        candidates.append((trip, driver_point, destination_point,
+                           proximity_factor))
+
+    destination_points = [candidate[2] for candidate in candidates]
+    driver_points = [candidate[1] for candidate in candidates]
+    rider_distances_from_destination = get_distances(
+        [rider_point] * len(candidates), destination_points)
+    driver_distances_from_destination = get_distances(
+        driver_points, destination_points)
+    driver_distances_from_rider = get_distances(
+        driver_points, [rider_point] * len(candidates))
+
+    best_trips = []
+    for i, (trip, driver_point, destination_point,
+            proximity_factor) in enumerate(candidates):
+        cost = get_trip_cost(
+            driver_distances_from_rider[i],
+            rider_distances_from_destination[i],
+            driver_distances_from_destination[i],
+            trip.driver_speed,
+            trip.available_seats,
+            proximity_factor)
+
+        # best_trips is a bounded heap on -cost: its root is the worst of the
+        # best Trips found so far
+        item = (-cost, -trip.id, trip)
+        if max_results is None or len(best_trips) < max_results:
+            heapq.heappush(best_trips, item)
+        elif item > best_trips[0]:
+            heapq.heapreplace(best_trips, item)
+
+    best_trips.sort(reverse=True)
+    return [(-cost, trip) for cost, trip_id, trip in best_trips]
+
+
+def get_open_searches():
+    """
+    Returns the Searches made in the last settings.MATCHING_SEARCH_LIFETIME
+    minutes by Persons not already participating in, or requesting, an
+    active Trip. Only the latest Search of each Person is considered.
+    """
+    since = datetime.datetime.now() - datetime.timedelta(
+                                    minutes=settings.MATCHING_SEARCH_LIFETIME)
+    busy_persons = list(models.Participation.objects.filter(
+        finished=False,
+        refused=False,
+        requested_deleted=False,
+        trip__active=True,
+    ).values_list('author', flat=True))
+
+    searches = models.Search.objects.filter(
+        published__gte=since,
+    ).select_related('origin', 'destination').order_by('-published')
+    if busy_persons:
+        searches = searches.exclude(author__in=busy_persons)
+
+    latest_searches = {}
+    for search in searches:
+        latest_searches.setdefault(search.author_id, search)
+    return latest_searches.values()
+
+
+def assign_searches(searches=None):
+    """
+    Matches many Searches to active Trips at once, by default all the open
+    ones [See get_open_searches()]. The candidates of all the Searches are
+    loaded together, the cost of each suitable (Search, Trip) pair is
+    computed as in search_ride() and the pairs are assigned by
+    assign_seats(), so that no Trip is proposed to more riders than it has
+    seats. The proposed Trip of each Search is stored in
+    Search.proposed_trip. Returns a dictionary search id -> trip id of the
+    Searches that got a Trip.
+    """
+    if searches is None:
+        searches = get_open_searches()
+
+    search_destinations = {}
+    trip_ids = set()
+    search_bounds = models.location.get_bounds_around(
+        [search.destination for search in searches])
+    for search, bounds in zip(searches, search_bounds):
+        destinations = find_candidates(search.destination, search.origin,
+                                       bounds)
+        search_destinations[search.id] = destinations
+        trip_ids.update(destinations.keys())
+
+    trips = load_candidates(trip_ids)
+
+    costs = []
+    for search in searches:
+        for cost, trip in score_trips(trips, search_destinations[search.id],
+                                      search.origin):
+            costs.append((cost, search.id, trip.id))
+
+    seats = dict([(trip.id, trip.available_seats) for trip in trips])
+    assignment = assign_seats(costs, seats)
+
+    for search in searches:
+        proposed_trip_id = assignment.get(search.id)
+        if search.proposed_trip_id != proposed_trip_id:
+            search.proposed_trip_id = proposed_trip_id
+            search.save()
+    return assignment
+
+
+def assign_seats(costs, seats):
+    """
+    Given a list of (cost, search id, trip id) and a dictionary trip id ->
+    number of available seats, greedily assigns to each search at most one
+    trip, cheapest pairs first, without exceeding the seats of any trip.
+    Returns a dictionary search id -> trip id.
+    """
+    seats = dict(seats)
+    assignment = {}
+    for cost, search_id, trip_id in sorted(costs):
+        if search_id in assignment or seats[trip_id] <= 0:
+            continue
+        assignment[search_id] = trip_id
+        seats[trip_id] -= 1
+    return assignment
+
+
+def get_trip_cost(driver_distance_from_rider, rider_distance_from_destination,
+                  driver_distance_from_destination, driver_speed, vacancy,
+                  proximity_factor):
+    """
+    Returns the cost of a Trip for a rider, the lower the better. It is
+    given by the detour the driver has to make to pick up the rider, the
+    time the rider has to wait for the driver, the seats still available and
+    how fast the driver is approaching the rider.
+    """
+    detour = (driver_distance_from_rider + rider_distance_from_destination -
+              driver_distance_from_destination)
+    if not driver_speed or driver_speed < DEFAULT_DRIVER_SPEED / 2:
+        driver_speed = DEFAULT_DRIVER_SPEED
+    pickup_minutes = driver_distance_from_rider / driver_speed * 60
+    return (DETOUR_WEIGHT * max(detour, 0) +
+            PICKUP_WEIGHT * pickup_minutes -
+            VACANCY_WEIGHT * vacancy -
+            PROXIMITY_WEIGHT * proximity_factor)
+
+
+def get_distance(point_a, point_b):
+    """
+    Returns the distance in KMs between two (latitude, longitude) tuples,
+    with the precision given by settings.MATCHING_DISTANCE_PRECISION
+    """
+    return distance_engine.exact(point_a[0], point_a[1],
+                                 point_b[0], point_b[1])
+
+
+def get_distances(points_a, points_b):
+    """
+    Returns the list of distances in KMs between each (latitude, longitude)
+    tuple of points_a and the corresponding one of points_b. If NumPy is
+    available and the precision is 'great_circle', all the distances are
+    computed at once.
+    """
+    if not points_a:
+        return []
+    if vectorized is None or distance_engine.precision != 'great_circle':
+        return [get_distance(point_a, point_b)
+                for point_a, point_b in zip(points_a, points_b)]
+    lat1, lng1 = zip(*points_a)
+    lat2, lng2 = zip(*points_b)
+    return vectorized.great_circle(lat1, lng1, lat2, lng2).tolist()
+
+
+def get_vacancies(trips):
+    """
+    Returns a dictionary trip id -> number of seats still available, computed
+    like Trip.update_vacancy() does but with a single query for all the Trips
+    """
+    riders = get_riders_count([trip.id for trip in trips])
+    return dict([(trip.id, trip.modality.capacity - riders.get(trip.id, 0))
+                 for trip in trips])
+
+
+def get_vacancies_by_id(trip_ids):
+    """
+    Like get_vacancies(), given just the ids of the Trips
+    """
+    if not trip_ids:
+        return {}
+    capacities = models.Trip.objects.filter(
+        id__in=list(trip_ids),
+    ).values_list('id', 'modality__capacity')
+    riders = get_riders_count(trip_ids)
+    return dict([(trip_id, capacity - riders.get(trip_id, 0))
+                 for trip_id, capacity in capacities])
+
+
+def get_riders_count(trip_ids):
+    """
+    Returns a dictionary trip id -> number of riders currently in the Trip,
+    for the Trips with at least one rider
+    """
+    riders = models.Participation.objects.filter(
+        trip__in=list(trip_ids),
+        started=True,
+        finished=False,
+    ).exclude(role='driver').values('trip').annotate(
+        riders=django.db.models.Count('id'))
+    return dict([(row['trip'], row['riders']) for row in riders])
+
+
+def get_recent_tracks(person_ids, max_results=10):
+    """
+    Returns a dictionary person id -> list of (latitude, longitude) of the
+    last max_results locations of each Person, oldest first. Like
+    Person.get_recent_locations(), the locations of the active driver
+    Participation are preferred to the ones of the Person.
+    """
+    if not person_ids:
+        return {}
+    participations = dict(models.Participation.objects.filter(
+        author__in=person_ids,
+        role='driver',
+        started=True,
+        finished=False,
+        requested_deleted=False,
+        trip__active=True,
+    ).values_list('id', 'author'))
+
+    location_ids = get_recent_location_ids(models.Participation.locations.through,
+                                           'participation',
+                                           participations.keys(),
+                                           max_results)
+    recent_location_ids = dict([(participations[participation_id], ids)
+                                for participation_id, ids
+                                in location_ids.iteritems()])
+
+    other_person_ids = [person_id for person_id in person_ids
+                        if person_id not in recent_location_ids]
+    recent_location_ids.update(get_recent_location_ids(
+                                   models.Person.locations.through,
+                                   'person',
+                                   other_person_ids,
+                                   max_results))
+
+    all_ids = []
+    for ids in recent_location_ids.itervalues():
+        all_ids.extend(ids)
+    points = {}
+    if all_ids:
+        points = models.Location.objects.filter(id__in=all_ids).values_list(
+            'id', 'georss_point_latitude', 'georss_point_longitude')
+        points = dict([(location_id, (latitude, longitude))
+                       for location_id, latitude, longitude in points])
+
+    tracks = {}
+    for person_id in person_ids:
+        ids = recent_location_ids.get(person_id, [])
+        tracks[person_id] = [points[location_id] for location_id in ids]
+    return tracks
+
+
+def get_recent_location_ids(through, owner_field, owner_ids, max_results):
+    """
+    Given the intermediate model of a locations ManyToManyField, returns a
+    dictionary owner id -> ids of the last max_results locations of each
+    owner, oldest first.
+    A single query is made, the UNION of a LIMITed query per owner: each one
+    is answered by the unique (owner, location) index of the table, reading
+    at most max_results rows whatever the length of the track
+    """
+    if not owner_ids:
+        return {}
+    quote = django.db.connection.ops.quote_name
+    table = quote(through._meta.db_table)
+    owner = quote(through._meta.get_field(owner_field).column)
+    location = quote(through._meta.get_field('location').column)
+    # Each SELECT is wrapped in a subquery since not every database accepts
+    # ORDER BY and LIMIT in the members of a UNION
+    select = ("SELECT * FROM (SELECT %s, %s FROM %s WHERE %s = %%s "
+              "ORDER BY %s DESC LIMIT %d) recent_" %
+              (owner, location, table, owner, location, int(max_results)))
+    owner_ids = list(owner_ids)
+    query = " UNION ALL ".join([select + str(i)
+                                for i in range(len(owner_ids))])
+    cursor = django.db.connection.cursor()
+    cursor.execute(query, owner_ids)
+
+    recent = {}
+    for owner_id, location_id in cursor.fetchall():
+        recent.setdefault(owner_id, []).append(location_id)
+    for ids in recent.itervalues():
+        ids.sort()
+    return recent
+
+
 def get_proximity_factor(person, position):
     """
     Given a person and a location, it determines if the person is approaching it
     or getting away from it, by retrieving some recent locations of the person and
-    computing their distance from the location. The set of ordered distances is then
-    given to location_proximity_factor that retrives the factor
+    comparing their distance from the location. [See get_track_proximity_factor()]
+    If the Track of the person is up to date, no location is retrieved.
     """
+    track = get_fresh_track(person)
+    if track:
+        return track.get_proximity_factor(position.georss_point_latitude,
+                                          position.georss_point_longitude)
+
     recent_locations = person.get_recent_locations(10)
-    recent_locations_distance_from_position = [location.distance(position)
-                                               for location in recent_locations
-                                               ]
-    proximity_factor = location_proximity_factor(
-                            recent_locations_distance_from_position)
-    return proximity_factor
+    recent_points = [(location.georss_point_latitude,
+                      location.georss_point_longitude)
+                     for location in recent_locations]
+    position_point = (position.georss_point_latitude,
+                      position.georss_point_longitude)
+    return get_track_proximity_factor(recent_points, position_point)
+
+
+def get_track_proximity_factor(points, point):
+    """
+    Like location_proximity_factor() on the distances of a list of
+    (latitude, longitude) tuples from a point, but the distances are just
+    compared, mostly without being computed exactly [See geopy.tiered]
+    """
+    return sum([distance_engine.compare(points[i], point, points[i + 1], point)
+                for i in xrange(len(points) - 1)])
 
 def location_proximity_factor(distances):
     """
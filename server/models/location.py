@@ -18,13 +18,24 @@
 
 import django.db.models as models
 import geopy.distance
+import geopy.geohash
 import geopy.point
 import geopy.geocoders
+import geopy.geocoders.cache
+import geopy.geocoders.chain
+import geopy.geocoders.coalesce
+import geopy.geocoders.offline
 import settings
 import copy
 import datetime
 import django.core.exceptions
 import django.db
+import server.backfill
+
+try:
+    import geopy.vectorized as vectorized
+except ImportError:
+    vectorized = None
 
 WAYPOINT_CHOICES = (
     (u'orig', u'Origin'),
@@ -39,6 +50,75 @@ RECURS_CHOICES = (
     (u'monthly', u'Monthly'),
 )
 
+shared_geocoder = None
+
+def get_geocoder():
+    """
+    Returns the geocoder used by Locations: the geocoders named in
+    settings.GEOCODERS, tried in order [See geopy.geocoders.chain], called
+    once for concurrent lookups of the same address or point [See
+    geopy.geocoders.coalesce], behind a persistent cache unless
+    settings.GEOCODER_CACHE is empty. It is created once per process.
+    """
+    global shared_geocoder
+    if shared_geocoder is None:
+        factories = {
+            'google': lambda: geopy.geocoders.Google(
+                                                settings.GOOGLE_MAPS_API_KEY),
+            'yahoo': lambda: geopy.geocoders.Yahoo(settings.YAHOO_APP_ID),
+            'geonames': geopy.geocoders.GeoNames,
+            'virtualearth': geopy.geocoders.VirtualEarth,
+            'offline': lambda: geopy.geocoders.offline.OfflineGeocoder(
+                                                settings.GEOCODER_GAZETTEER),
+        }
+        geocoder = geopy.geocoders.chain.GeocoderChain(
+            [factories[name]() for name in settings.GEOCODERS],
+            rate=settings.GEOCODER_RATE,
+            max_failures=settings.GEOCODER_MAX_FAILURES,
+            reset_timeout=settings.GEOCODER_RESET_TIMEOUT,
+            slow=settings.GEOCODER_SLOW)
+        geocoder = geopy.geocoders.coalesce.CoalescingGeocoder(
+            geocoder, precision=settings.GEOCODER_CACHE_PRECISION)
+        if settings.GEOCODER_CACHE:
+            geocoder = geopy.geocoders.cache.CachedGeocoder(
+                geocoder, settings.GEOCODER_CACHE,
+                ttl=settings.GEOCODER_CACHE_TTL,
+                max_entries=settings.GEOCODER_CACHE_SIZE,
+                precision=settings.GEOCODER_CACHE_PRECISION)
+        shared_geocoder = geocoder
+    return shared_geocoder
+
+def get_bounds_around(locations, diagonal_meters=None):
+    """
+    Returns the list of the boxes around the given Locations, like
+    Location.get_bounds_around() would. If NumPy is available, the corners of
+    all the boxes are computed at once.
+    """
+    diagonals = [(diagonal_meters or location.offset) / 1000.0
+                 for location in locations]
+    points = [geopy.point.Point.from_string(location.georss_point)
+              for location in locations]
+    # The bearings of the corners of get_box_around(): the top left one at 40
+    # rather than 315 gives the box its northern extent
+    bearings = (40, 135, 225, 315)
+    if vectorized is None:
+        destination = geopy.distance.GreatCircleDistance().destination
+        corners = [[destination(point, bearing, diagonal)
+                    for bearing in bearings]
+                   for point, diagonal in zip(points, diagonals)]
+        corners = [([corner.latitude for corner in point_corners],
+                    [corner.longitude for corner in point_corners])
+                   for point_corners in corners]
+    else:
+        latitudes, longitudes = vectorized.destination(
+            [[point.latitude] for point in points],
+            [[point.longitude] for point in points],
+            bearings,
+            [[diagonal] for diagonal in diagonals])
+        corners = zip(latitudes.tolist(), longitudes.tolist())
+    return [(min(latitudes), max(latitudes), min(longitudes), max(longitudes))
+            for latitudes, longitudes in corners]
+
 class Location(models.Model):
     """
     Represents a single location.
@@ -63,6 +143,17 @@ class Location(models.Model):
     georss_point_latitude = models.FloatField(null=False, default=0)
     georss_point_longitude = models.FloatField(null=False, default=0)
     """
+    geohash is kept in sync with the coordinates, so that proximity queries
+    can be answered by indexed prefix lookups.
+    See server.spatial.get_geohash_prefixes()
+    """
+    geohash = models.CharField(max_length=12, blank=True, db_index=True)
+    """
+    address_pending is True while the address details are being retrieved
+    in the background. See complete_fields()
+    """
+    address_pending = models.BooleanField(default=False, db_index=True)
+    """
     The following should be members of a separate Date-Time class but are
     included here for simplicity
     """
@@ -76,10 +167,29 @@ class Location(models.Model):
         """
         Returns the distance in KMs from this location to a given location
         """
-        current_point = geopy.point.Point(self.georss_point)
-        location_point = geopy.point.Point(location.georss_point)
-        distance = geopy.distance.distance(current_point, location_point)
-        return distance.kilometers
+        latitude, longitude = self.get_coordinates()
+        other_latitude, other_longitude = location.get_coordinates()
+        return geopy.distance.vincenty_km_memo(latitude, longitude,
+                                               other_latitude, other_longitude)
+
+    def get_coordinates(self):
+        """
+        Returns the (latitude, longitude) of the Location. The float columns
+        are unset (0) until complete_fields() runs, in that case georss_point
+        is parsed instead.
+        """
+        if (self.georss_point_latitude or self.georss_point_longitude
+                or not self.georss_point):
+            return self.georss_point_latitude, self.georss_point_longitude
+        point = geopy.point.Point(self.georss_point)
+        return point.latitude, point.longitude
+
+    def get_geocoder(self):
+        """
+        Returns the geocoder used to complete the fields of the Location.
+        See get_geocoder()
+        """
+        return get_geocoder()
 
     def get_location_from_geopy_point(self, point):
         """
@@ -117,6 +227,14 @@ class Location(models.Model):
                       destination(self.georss_point,315,diagonal_kmeters))]
         return box_around
 
+    def get_bounds_around(self, diagonal_meters=None):
+        """
+        Like get_box_around, but the box is returned as a tuple of plain
+        coordinates (lat_min, lat_max, lon_min, lon_max). No Location is
+        created, hence no geocoding takes place.
+        """
+        return get_bounds_around([self], diagonal_meters)[0]
+
     def complete_fields(self):
         """
         This method looks for missing fields and tries to complete them also by
@@ -131,9 +249,32 @@ class Location(models.Model):
             self.address_to_point()
         elif not self.town or not self.street:
             """
-            At this point we have a GeoRSS point but not Address details
+            At this point we have a GeoRSS point but not Address details.
+            With settings.GEOCODER_DEFERRED they are retrieved in the
+            background once the Location is saved [See server.backfill]
             """
-            self.point_to_address()
+            if settings.GEOCODER_DEFERRED:
+                point = geopy.point.Point.from_string(self.georss_point)
+                # The address of a saved Location which did not move was
+                # looked up already, even if it lacks the street (e.g. the
+                # town of the offline geocoder): it is not looked up again
+                moved = ((self.georss_point_latitude,
+                          self.georss_point_longitude)
+                         != (point.latitude, point.longitude))
+                if self.id is None or moved or not self.town:
+                    self.address_pending = True
+                self.georss_point_latitude = point.latitude
+                self.georss_point_longitude = point.longitude
+            else:
+                self.point_to_address()
+        else:
+            """
+            At this point we have both, the coordinates just need to be kept
+            in sync with the GeoRSS point
+            """
+            point = geopy.point.Point.from_string(self.georss_point)
+            self.georss_point_latitude = point.latitude
+            self.georss_point_longitude = point.longitude
 
 
     def address_to_point(self):
@@ -144,7 +285,7 @@ class Location(models.Model):
             (latitude, longitude))
         """
         try:
-            geocoder = geopy.geocoders.Google(settings.GOOGLE_MAPS_API_KEY)
+            geocoder = self.get_geocoder()
             address = self.street + ", " + str(self.postcode) + " " + self.town
             geo_info = geocoder.geocode(address)
             self.georss_point = str(geo_info[1][0]) + ' ' + str(geo_info[1][1])
@@ -169,10 +310,23 @@ class Location(models.Model):
         """
         point = geopy.point.Point.from_string(self.georss_point)
         try:
-            geocoder = geopy.geocoders.Google(settings.GOOGLE_MAPS_API_KEY)
+            geocoder = self.get_geocoder()
             geocoding_result = geocoder.reverse(
                                             (point.latitude,point.longitude) )
+        except Exception, e:
+            geocoding_result = e
+        self.set_address(geocoding_result)
+        self.georss_point_latitude = point.latitude
+        self.georss_point_longitude = point.longitude
 
+    def set_address(self, geocoding_result):
+        """
+        Sets street, postcode and town from the result of geocoder.reverse,
+        or empties them if geocoding_result is the exception it raised
+        """
+        try:
+            if isinstance(geocoding_result, Exception):
+                raise geocoding_result
             full_address = geocoding_result[0].split(",")
             #if type(full_address).__name__ == 'bool':
             #    self.georss_point_latitude = point.latitude
@@ -196,8 +350,6 @@ class Location(models.Model):
             self.town = ""
             self.street = ""
             self.postcode = 0
-        self.georss_point_latitude = point.latitude
-        self.georss_point_longitude = point.longitude
 
 
     def clean(self):
@@ -223,8 +375,15 @@ class Location(models.Model):
         if (    (not self.street or not self.town or not self.postcode)
                 and not self.georss_point):
             raise django.db.IntegrityError('Give either address details or georss_point')
+        was_pending = self.address_pending
         self.complete_fields()
+        self.geohash = geopy.geohash.Geohash().encode(
+            self.georss_point_latitude, self.georss_point_longitude)
         super(Location, self).save(*args, ** kwargs)
+        # Scheduled once, when the Location becomes pending: the backfiller
+        # retries the lookups which fail
+        if self.address_pending and not was_pending:
+            server.backfill.schedule(self.id)
 
 
     def __unicode__(self):
@@ -238,6 +397,8 @@ class Location(models.Model):
         location_dict = copy.deepcopy(self.__dict__)
         del location_dict['georss_point_latitude']
         del location_dict['georss_point_longitude']
+        del location_dict['geohash']
+        del location_dict['address_pending']
         del location_dict['id']
         del location_dict['_state']
         location_dict['leaves'] = self.leaves.isoformat(' ')
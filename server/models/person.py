@@ -72,9 +72,9 @@ class Person(authmodels.User):
         """
         if self.get_active_participation() and self.get_active_participation().role == 'driver':
             current_participation = self.get_active_participation()
-            recent_locations = list(current_participation.locations.filter().only("id","georss_point").order_by('-id')[:max_results])
+            recent_locations = list(current_participation.locations.filter().only("id","georss_point","georss_point_latitude","georss_point_longitude").order_by('-id')[:max_results])
         else:
-            recent_locations = list(self.locations.filter().only("id","georss_point").order_by('-id')[:max_results])
+            recent_locations = list(self.locations.filter().only("id","georss_point","georss_point_latitude","georss_point_longitude").order_by('-id')[:max_results])
         recent_locations.reverse()
         return recent_locations
 
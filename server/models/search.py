@@ -29,6 +29,7 @@ class Search(models.Model):
     author = models.ForeignKey('Person', related_name='person', blank=False, null=False)
     origin = models.ForeignKey('Location', related_name='origin', blank=False)
     destination = models.ForeignKey('Location', related_name='destination', blank=False)
+    proposed_trip = models.ForeignKey('Trip', related_name='proposed_searches', blank=True, null=True)
     href = models.URLField(verify_exists=False, blank=True, null=False)
 
     def __repr__(self):
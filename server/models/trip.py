@@ -57,7 +57,9 @@ class Trip(models.Model):
         """
         Returns the location representing the destination of the Trip
         """
-        destination = self.locations.filter(point='dest').only("id","georss_point")[0]
+        destination = self.locations.filter(point='dest').only(
+            "id","georss_point","georss_point_latitude",
+            "georss_point_longitude")[0]
         return destination
 
     def update_vacancy(self):
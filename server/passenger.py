@@ -23,10 +23,11 @@ import models
 import django.db
 
 
-def searchRide(source, destination, passenger):
+def searchRide(source, destination, passenger, search=None):
     """
     Given a source, a destination and the passenger, it searches for
-    a suitable ride.
+    a suitable ride. The Trips found are ordered from the most suitable one.
+    If the stored Search is given, its candidates are kept between calls.
     """
     passenger_active_participation = passenger.get_active_participation()
     if passenger_active_participation:
@@ -42,9 +43,13 @@ def searchRide(source, destination, passenger):
             resp = models.Response(models.Response.BAD_REQUEST,
                                "Message", e)
             return resp
-        passenger.location.save()
+        if not passenger.location.id:
+            passenger.location.save()
 
-    trips = matching.search_ride(destination,passenger)
+    if search:
+        trips = matching.search_standing(search, passenger)
+    else:
+        trips = matching.search_ride(destination,passenger)
 
     if not trips:
         return models.Response(models.Response.NOT_FOUND,
@@ -161,6 +166,7 @@ def startRide(trip, passenger):
         participation.started_timestamp = datetime.datetime.now()
         participation.started_position_id = passenger.location_id
         participation.save()
+        trip.update_vacancy()
     except Exception, e:
         resp = models.Response(models.Response.BAD_REQUEST,
                                "Message", e)
@@ -195,6 +201,8 @@ def finishRide(trip, passenger):
     participation.finished_timestamp = datetime.datetime.now()
     participation.finished_position_id = passenger.location_id
     participation.save()
+    trip.update_vacancy()
+    matching.forget_track(passenger)
     resp = models.Response(models.Response.ALL_OK,
                                "Participation", participation)
     return resp
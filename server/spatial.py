@@ -0,0 +1,507 @@
+"""
+   Copyright 2010 Daniel Graziotin <daniel.graziotin@acm.org>
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+"""
+This module holds the in-memory spatial structures used by the matching
+Algorithm of Dycapo
+"""
+import geopy.geohash
+import math
+import threading
+import time
+
+# Kilometers in a degree of latitude, used for local planar approximations
+KM_PER_DEGREE = 111.195
+
+def get_offset(lat1, lng1, lat2, lng2):
+    """
+    Returns the (east, north) offset in KMs from the first point to the
+    second one, using an equirectangular approximation. It is accurate
+    enough for the few KMs involved in matching.
+    """
+    mean_latitude = math.radians((lat1 + lat2) / 2.)
+    return ((lng2 - lng1) * KM_PER_DEGREE * math.cos(mean_latitude),
+            (lat2 - lat1) * KM_PER_DEGREE)
+
+def distance_to_polyline(latitude, longitude, points):
+    """
+    Returns the distance in KMs of a point from a polyline given as a list of
+    (latitude, longitude) tuples, together with the position along the
+    polyline of the nearest point: i + t means the fraction t of the i-th
+    segment.
+    """
+    if len(points) == 1:
+        east, north = get_offset(latitude, longitude, *points[0])
+        return math.hypot(east, north), 0.0
+    best = None
+    offsets = [get_offset(latitude, longitude, point_latitude,
+                          point_longitude)
+               for point_latitude, point_longitude in points]
+    for i in xrange(len(offsets) - 1):
+        (x1, y1), (x2, y2) = offsets[i], offsets[i + 1]
+        dx, dy = x2 - x1, y2 - y1
+        length = dx * dx + dy * dy
+        if length:
+            t = min(max(-(x1 * dx + y1 * dy) / length, 0.0), 1.0)
+        else:
+            t = 0.0
+        distance = math.hypot(x1 + t * dx, y1 + t * dy)
+        if best is None or distance < best[0]:
+            best = (distance, i + t)
+    return best
+
+def get_geohash_prefixes(lat_min, lat_max, lon_min, lon_max, max_prefixes=8):
+    """
+    Returns a list of geohash prefixes such that every point inside the
+    given box has a geohash starting with one of them. The prefixes are as
+    long as possible while being at most max_prefixes, so that a box query
+    becomes a few prefix scans on an indexed geohash column.
+    See geopy.geohash.Geohash.cover_bbox()
+    """
+    return geopy.geohash.Geohash().cover_bbox(lat_min, lat_max,
+                                              lon_min, lon_max, max_prefixes)
+
+class GridIndex(object):
+    """
+    A process-local spatial index of points, keyed by an arbitrary id.
+    Points are stored in buckets of a regular latitude/longitude grid, so
+    that a box query only has to look at the buckets overlapping the box.
+    """
+
+    def __init__(self, cell_degrees=0.01):
+        self.cell_degrees = cell_degrees
+        self.buckets = {}
+        self.points = {}
+        self.loaded_timestamp = None
+        self.lock = threading.Lock()
+
+    def get_cell(self, latitude, longitude):
+        """
+        Returns the grid cell containing the given coordinates
+        """
+        return (int(latitude // self.cell_degrees),
+                int(longitude // self.cell_degrees))
+
+    def add(self, key, latitude, longitude):
+        """
+        Adds a point to the index, replacing any point previously stored
+        under the same key
+        """
+        self.lock.acquire()
+        try:
+            self._remove(key)
+            cell = self.get_cell(latitude, longitude)
+            self.points[key] = (latitude, longitude, cell)
+            self.buckets.setdefault(cell, set()).add(key)
+        finally:
+            self.lock.release()
+
+    def remove(self, key):
+        """
+        Removes a point from the index. Unknown keys are ignored
+        """
+        self.lock.acquire()
+        try:
+            self._remove(key)
+        finally:
+            self.lock.release()
+
+    def _remove(self, key):
+        if key not in self.points:
+            return
+        cell = self.points.pop(key)[2]
+        bucket = self.buckets[cell]
+        bucket.discard(key)
+        if not bucket:
+            del self.buckets[cell]
+
+    def get(self, key):
+        """
+        Returns the (latitude, longitude) stored for key, or None
+        """
+        point = self.points.get(key)
+        if point is None:
+            return None
+        return point[:2]
+
+    def search(self, lat_min, lat_max, lon_min, lon_max):
+        """
+        Returns a dictionary key -> (latitude, longitude) of all the points
+        lying inside the given box
+        """
+        cell_min = self.get_cell(lat_min, lon_min)
+        cell_max = self.get_cell(lat_max, lon_max)
+        found = {}
+        self.lock.acquire()
+        try:
+            for cell_lat in xrange(cell_min[0], cell_max[0] + 1):
+                for cell_lon in xrange(cell_min[1], cell_max[1] + 1):
+                    for key in self.buckets.get((cell_lat, cell_lon), ()):
+                        latitude, longitude = self.points[key][:2]
+                        if (lat_min <= latitude <= lat_max and
+                            lon_min <= longitude <= lon_max):
+                            found[key] = (latitude, longitude)
+        finally:
+            self.lock.release()
+        return found
+
+    def load(self, points):
+        """
+        Replaces the content of the index with the given iterable of
+        (key, latitude, longitude) tuples
+        """
+        buckets = {}
+        indexed = {}
+        for key, latitude, longitude in points:
+            cell = self.get_cell(latitude, longitude)
+            indexed[key] = (latitude, longitude, cell)
+            buckets.setdefault(cell, set()).add(key)
+        self.lock.acquire()
+        try:
+            self.buckets = buckets
+            self.points = indexed
+            self.loaded_timestamp = time.time()
+        finally:
+            self.lock.release()
+
+    def is_stale(self, max_age):
+        """
+        Returns True if the index was never loaded or was loaded more than
+        max_age seconds ago
+        """
+        if self.loaded_timestamp is None:
+            return True
+        return time.time() - self.loaded_timestamp > max_age
+
+    def __len__(self):
+        return len(self.points)
+
+
+class CorridorIndex(object):
+    """
+    A process-local index of the routes of active Trips, keyed by trip id. A
+    route is a polyline given as a list of (latitude, longitude) tuples. Each
+    route is registered in all the cells of a regular grid it crosses, so
+    that finding the routes passing near a point only has to look at the
+    routes of one cell and its neighbours.
+    """
+    # A point of a route is passed once the driver is this many KMs past it
+    PASSED_KM = 0.02
+
+    def __init__(self, cell_degrees=0.05):
+        self.cell_degrees = cell_degrees
+        self.buckets = {}
+        self.routes = {}
+        self.loaded_timestamp = None
+        self.lock = threading.Lock()
+
+    def get_cell(self, latitude, longitude):
+        """
+        Returns the grid cell containing the given coordinates
+        """
+        return (int(latitude // self.cell_degrees),
+                int(longitude // self.cell_degrees))
+
+    def get_route_cells(self, points):
+        """
+        Returns the set of grid cells crossed by a polyline
+        """
+        cells = set([self.get_cell(*point) for point in points])
+        step = self.cell_degrees / 2.
+        for (lat1, lng1), (lat2, lng2) in zip(points, points[1:]):
+            steps = int(max(abs(lat2 - lat1), abs(lng2 - lng1)) / step) + 1
+            for i in xrange(1, steps):
+                cells.add(self.get_cell(lat1 + (lat2 - lat1) * i / steps,
+                                        lng1 + (lng2 - lng1) * i / steps))
+        return cells
+
+    def set_route(self, key, points):
+        """
+        Stores the route of a Trip, replacing the previous one
+        """
+        points = list(points)
+        cells = self.get_route_cells(points)
+        self.lock.acquire()
+        try:
+            self._set_route(key, points, cells)
+        finally:
+            self.lock.release()
+
+    def _set_route(self, key, points, cells):
+        self._remove(key)
+        self.routes[key] = (points, cells)
+        for cell in cells:
+            self.buckets.setdefault(cell, set()).add(key)
+
+    def get_route(self, key):
+        """
+        Returns the route of a Trip, or None
+        """
+        route = self.routes.get(key)
+        if route is None:
+            return None
+        return route[0]
+
+    def advance(self, key, latitude, longitude, max_distance=None):
+        """
+        Moves the start of a route to the current position of the driver:
+        the points of the route the driver has already passed are dropped,
+        so that the route only holds what is still to be driven. A point is
+        kept until the driver is PASSED_KM past it, e.g. the origin while
+        the driver reaches it. The destination, the last point, is always
+        kept, even once the driver reaches or passes it. A position farther
+        than max_distance KMs from the route, e.g. a stale one, leaves the
+        route unchanged.
+        """
+        self.lock.acquire()
+        try:
+            route = self.routes.get(key)
+            if route is None or not route[0]:
+                return
+            points = route[0]
+            distance, along = distance_to_polyline(latitude, longitude,
+                                                   points)
+            if max_distance is not None and distance > max_distance:
+                return
+            start = int(along)
+            if start < len(points) - 1:
+                east, north = get_offset(*(points[start] + points[start + 1]))
+                if (along - start) * math.hypot(east, north) > self.PASSED_KM:
+                    start += 1
+            points = points[min(start, len(points) - 1):]
+            if points[0] != (latitude, longitude):
+                points.insert(0, (latitude, longitude))
+            self._set_route(key, points, self.get_route_cells(points))
+        finally:
+            self.lock.release()
+
+    def remove(self, key):
+        """
+        Removes a route from the index. Unknown keys are ignored
+        """
+        self.lock.acquire()
+        try:
+            self._remove(key)
+        finally:
+            self.lock.release()
+
+    def _remove(self, key):
+        if key not in self.routes:
+            return
+        for cell in self.routes.pop(key)[1]:
+            bucket = self.buckets[cell]
+            bucket.discard(key)
+            if not bucket:
+                del self.buckets[cell]
+
+    def search(self, latitude, longitude, width_km):
+        """
+        Returns a dictionary key -> (distance, along) of all the routes
+        passing within width_km of the given point. See
+        distance_to_polyline() for the meaning of distance and along.
+        """
+        cell_lat, cell_lon = self.get_cell(latitude, longitude)
+        reach = int(width_km / (KM_PER_DEGREE * self.cell_degrees)) + 1
+        keys = set()
+        self.lock.acquire()
+        try:
+            for i in xrange(cell_lat - reach, cell_lat + reach + 1):
+                for j in xrange(cell_lon - reach, cell_lon + reach + 1):
+                    keys.update(self.buckets.get((i, j), ()))
+            routes = [(key, self.routes[key][0]) for key in keys]
+        finally:
+            self.lock.release()
+
+        found = {}
+        for key, points in routes:
+            distance, along = distance_to_polyline(latitude, longitude,
+                                                   points)
+            if distance <= width_km:
+                found[key] = (distance, along)
+        return found
+
+    def load(self, routes):
+        """
+        Replaces the content of the index with the given iterable of
+        (key, points) tuples
+        """
+        buckets = {}
+        indexed = {}
+        for key, points in routes:
+            points = list(points)
+            cells = self.get_route_cells(points)
+            indexed[key] = (points, cells)
+            for cell in cells:
+                buckets.setdefault(cell, set()).add(key)
+        self.lock.acquire()
+        try:
+            self.buckets = buckets
+            self.routes = indexed
+            self.loaded_timestamp = time.time()
+        finally:
+            self.lock.release()
+
+    def is_stale(self, max_age):
+        """
+        Returns True if the index was never loaded or was loaded more than
+        max_age seconds ago
+        """
+        if self.loaded_timestamp is None:
+            return True
+        return time.time() - self.loaded_timestamp > max_age
+
+    def __len__(self):
+        return len(self.routes)
+
+
+class BoxIndex(object):
+    """
+    A process-local index of boxes, keyed by an arbitrary id, each holding a
+    set of matches. Boxes are registered in all the cells of a regular grid
+    they overlap, so that the boxes containing a point are found by looking
+    at a single cell. Used to keep the candidate Trips of standing Searches
+    up to date: the box is the area around the Search destination and the
+    matches are the ids of the Trips with a destination inside it.
+    """
+
+    def __init__(self, cell_degrees=0.01):
+        self.cell_degrees = cell_degrees
+        self.buckets = {}
+        self.boxes = {}
+        self.match_boxes = {}
+        self.lock = threading.Lock()
+
+    def get_cell(self, latitude, longitude):
+        """
+        Returns the grid cell containing the given coordinates
+        """
+        return (int(latitude // self.cell_degrees),
+                int(longitude // self.cell_degrees))
+
+    def get_box_cells(self, bounds):
+        """
+        Returns the grid cells overlapped by a (lat_min, lat_max, lon_min,
+        lon_max) box
+        """
+        lat_min, lat_max, lon_min, lon_max = bounds
+        cell_min = self.get_cell(lat_min, lon_min)
+        cell_max = self.get_cell(lat_max, lon_max)
+        return [(cell_lat, cell_lon)
+                for cell_lat in xrange(cell_min[0], cell_max[0] + 1)
+                for cell_lon in xrange(cell_min[1], cell_max[1] + 1)]
+
+    def set(self, key, bounds, matches):
+        """
+        Stores a box with its set of matches, replacing any box previously
+        stored under the same key
+        """
+        self.lock.acquire()
+        try:
+            self._remove(key)
+            self.boxes[key] = (bounds, set(matches), time.time())
+            for cell in self.get_box_cells(bounds):
+                self.buckets.setdefault(cell, set()).add(key)
+            for match in matches:
+                self.match_boxes.setdefault(match, set()).add(key)
+        finally:
+            self.lock.release()
+
+    def get(self, key):
+        """
+        Returns a (matches, timestamp) tuple for the box stored under key,
+        where timestamp is the time it was set, or None
+        """
+        self.lock.acquire()
+        try:
+            box = self.boxes.get(key)
+            if box is None:
+                return None
+            return set(box[1]), box[2]
+        finally:
+            self.lock.release()
+
+    def add_match(self, latitude, longitude, match):
+        """
+        Adds match to all the boxes containing the given point. Returns the
+        keys of the boxes updated
+        """
+        updated = []
+        self.lock.acquire()
+        try:
+            cell = self.get_cell(latitude, longitude)
+            for key in self.buckets.get(cell, ()):
+                bounds, matches, timestamp = self.boxes[key]
+                lat_min, lat_max, lon_min, lon_max = bounds
+                if (lat_min <= latitude <= lat_max and
+                    lon_min <= longitude <= lon_max):
+                    matches.add(match)
+                    self.match_boxes.setdefault(match, set()).add(key)
+                    updated.append(key)
+        finally:
+            self.lock.release()
+        return updated
+
+    def remove_match(self, match):
+        """
+        Removes match from all the boxes holding it
+        """
+        self.lock.acquire()
+        try:
+            for key in self.match_boxes.pop(match, ()):
+                self.boxes[key][1].discard(match)
+        finally:
+            self.lock.release()
+
+    def remove(self, key):
+        """
+        Removes a box from the index. Unknown keys are ignored
+        """
+        self.lock.acquire()
+        try:
+            self._remove(key)
+        finally:
+            self.lock.release()
+
+    def _remove(self, key):
+        if key not in self.boxes:
+            return
+        bounds, matches, timestamp = self.boxes.pop(key)
+        for cell in self.get_box_cells(bounds):
+            bucket = self.buckets[cell]
+            bucket.discard(key)
+            if not bucket:
+                del self.buckets[cell]
+        for match in matches:
+            keys = self.match_boxes[match]
+            keys.discard(key)
+            if not keys:
+                del self.match_boxes[match]
+
+    def expire(self, max_age):
+        """
+        Removes the boxes set more than max_age seconds ago
+        """
+        oldest = time.time() - max_age
+        self.lock.acquire()
+        try:
+            for key in [key for key, box in self.boxes.iteritems()
+                        if box[2] < oldest]:
+                self._remove(key)
+        finally:
+            self.lock.release()
+
+    def __len__(self):
+        return len(self.boxes)
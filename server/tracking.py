@@ -0,0 +1,190 @@
+"""
+   Copyright 2010 Daniel Graziotin <daniel.graziotin@acm.org>
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+"""
+This module keeps a rolling summary of the recent positions of each Person,
+updated on every position update, so that the matching Algorithm does not
+have to read the locations of a Person from the database.
+"""
+import collections
+import datetime
+import math
+import spatial
+import threading
+import time
+
+class Track(object):
+    """
+    The last positions of a Person as (location id, latitude, longitude)
+    tuples, oldest first, together with a smoothed heading, the (east, north)
+    displacement in KMs between consecutive positions, and a smoothed
+    velocity vector in km/s (east, north).
+    """
+
+    def __init__(self, max_points=10, smoothing=0.5):
+        self.points = collections.deque(maxlen=max_points)
+        self.smoothing = smoothing
+        self.heading = (0.0, 0.0)
+        self.velocity = (0.0, 0.0)
+        self.timestamp = None
+        self.updated = None
+
+    def update(self, location_id, latitude, longitude, timestamp=None):
+        """
+        Appends a new position to the Track, taken at timestamp (seconds
+        since the epoch, now by default), and updates heading and velocity.
+        Positions taken before the last one, received late, leave the Track
+        unchanged: they would point heading and velocity backwards. Positions
+        taken at the same time as the last one, e.g. sent in a batch, update
+        the heading only.
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        self.updated = time.time()
+        if self.timestamp is not None and timestamp < self.timestamp:
+            return
+        if self.points:
+            east, north = self.get_offset(self.points[-1][1],
+                                          self.points[-1][2],
+                                          latitude, longitude)
+            self.heading = self.smooth(self.heading, east, north)
+            if timestamp > self.timestamp:
+                elapsed = timestamp - self.timestamp
+                self.velocity = self.smooth(self.velocity,
+                                            east / elapsed, north / elapsed)
+        self.points.append((location_id, latitude, longitude))
+        self.timestamp = timestamp
+
+    def smooth(self, vector, east, north):
+        return (self.smoothing * east + (1 - self.smoothing) * vector[0],
+                self.smoothing * north + (1 - self.smoothing) * vector[1])
+
+    def get_offset(self, lat1, lng1, lat2, lng2):
+        """
+        Returns the (east, north) offset in KMs from the first point to the
+        second one. See spatial.get_offset()
+        """
+        return spatial.get_offset(lat1, lng1, lat2, lng2)
+
+    def get_last_location_id(self):
+        """
+        Returns the id of the last Location of the Track, or None
+        """
+        if not self.points:
+            return None
+        return self.points[-1][0]
+
+    def get_points(self):
+        """
+        Returns the (latitude, longitude) tuples of the Track, oldest first
+        """
+        return [(latitude, longitude)
+                for location_id, latitude, longitude in self.points]
+
+    def get_speed(self):
+        """
+        Returns the smoothed speed of the Person in km/h
+        """
+        return math.hypot(*self.velocity) * 3600
+
+    def get_proximity_factor(self, latitude, longitude):
+        """
+        Returns the proximity factor of the Track to the given point, in
+        constant time: the cosine of the angle between the heading and the
+        direction of the point, scaled to the range of
+        matching.location_proximity_factor() on the recent positions.
+        Positive if the Person is approaching the point, negative if getting
+        away from it, 0 if standing or at the point
+        """
+        if not self.points:
+            return 0
+        east, north = self.get_offset(self.points[-1][1], self.points[-1][2],
+                                      latitude, longitude)
+        norm = math.hypot(east, north) * math.hypot(*self.heading)
+        if not norm:
+            return 0
+        cosine = (self.heading[0] * east + self.heading[1] * north) / norm
+        return (len(self.points) - 1) * cosine
+
+
+class Tracker(object):
+    """
+    A process-local registry of the Tracks of all the Persons. Tracks not
+    updated for max_age seconds are dropped, checking every PURGE_EVERY
+    updates, so that the Tracks of the Persons who stopped sending their
+    position, or whose Trip finished in another process, do not pile up.
+    """
+    PURGE_EVERY = 100
+
+    def __init__(self, max_points=10, max_age=3600):
+        self.max_points = max_points
+        self.max_age = max_age
+        self.tracks = {}
+        self.updates = 0
+        self.lock = threading.Lock()
+
+    def update(self, person_id, location):
+        """
+        Adds a Location to the Track of a Person, as taken at its leaves
+        time if given
+        """
+        timestamp = None
+        if isinstance(location.leaves, datetime.datetime):
+            timestamp = (time.mktime(location.leaves.timetuple()) +
+                         location.leaves.microsecond / 1e6)
+        self.lock.acquire()
+        try:
+            track = self.tracks.get(person_id)
+            if track is None:
+                track = Track(self.max_points)
+                self.tracks[person_id] = track
+            track.update(location.id, location.georss_point_latitude,
+                         location.georss_point_longitude, timestamp)
+            self.updates += 1
+            if self.updates % self.PURGE_EVERY == 0:
+                self.purge()
+        finally:
+            self.lock.release()
+
+    def purge(self):
+        oldest = time.time() - self.max_age
+        for person_id, track in self.tracks.items():
+            if track.updated < oldest:
+                del self.tracks[person_id]
+
+    def get(self, person_id, location_id=None):
+        """
+        Returns the Track of a Person, or None. If location_id is given, the
+        Track is returned only if its last position is that Location, that
+        is if the Track is not missing updates received by other processes
+        """
+        track = self.tracks.get(person_id)
+        if track is None:
+            return None
+        if location_id is not None and \
+           track.get_last_location_id() != location_id:
+            return None
+        return track
+
+    def remove(self, person_id):
+        """
+        Forgets the Track of a Person
+        """
+        self.lock.acquire()
+        try:
+            self.tracks.pop(person_id, None)
+        finally:
+            self.lock.release()
@@ -89,6 +89,75 @@ ROOT_URLCONF = 'dycapo.urls'
 
 GOOGLE_MAPS_API_KEY = 'ABQIAAAAEA5TqsSgku8oY63GIt0kvxTpH3CbXHjuCVmaTc5MkkU4wO1RRhQOBSk1yb3j1mHbRPaRhtbSt_APcA'
 
+# Keep the destinations of active Trips in a process-local spatial index
+# instead of querying the database on each search. The index is reloaded
+# every MATCHING_INDEX_REFRESH seconds, so that Trips started by other
+# processes are eventually seen.
+MATCHING_SPATIAL_INDEX = True
+MATCHING_INDEX_REFRESH = 30
+
+# Also match Trips whose remaining route passes within this many meters of
+# both the rider and the rider destination. 0 disables it.
+MATCHING_CORRIDOR_WIDTH = 300
+
+# Cache the Trips with a destination near a geohash cell of this precision
+# for MATCHING_CACHE_TTL seconds. At most MATCHING_CACHE_SIZE cells are kept,
+# 0 disables the cache.
+MATCHING_CACHE_SIZE = 1000
+MATCHING_CACHE_TTL = 10
+MATCHING_CACHE_PRECISION = 6
+
+# Precision of the distances computed by the matching Algorithm: one of
+# 'equirectangular', 'great_circle' or 'vincenty'. Distances are compared on
+# cheap approximations first anyway, see geopy/tiered.py
+MATCHING_DISTANCE_PRECISION = 'great_circle'
+
+# Maximum number of Trips returned by a search, best first
+MATCHING_MAX_RESULTS = 10
+
+# Searches younger than this many minutes are matched by the periodic
+# batch matcher (manage.py matchsearches)
+MATCHING_SEARCH_LIFETIME = 30
+
+# Geocoders tried in order to complete Locations, among 'google', 'yahoo',
+# 'geonames', 'virtualearth' and 'offline'. Each one is called at most GEOCODER_RATE
+# times per second (None for no limit; 'offline' is local and never limited),
+# and is skipped for GEOCODER_RESET_TIMEOUT seconds after
+# GEOCODER_MAX_FAILURES consecutive errors or answers slower than
+# GEOCODER_SLOW seconds.
+GEOCODERS = ('google', 'geonames')
+YAHOO_APP_ID = ''
+GEOCODER_RATE = 10
+GEOCODER_MAX_FAILURES = 5
+GEOCODER_RESET_TIMEOUT = 60
+GEOCODER_SLOW = 5
+
+# Table of places used by the 'offline' geocoder to find the town of a point
+# without network calls, compiled from a GeoNames dump with
+# manage.py compilegazetteer [See geopy.geocoders.offline]
+GEOCODER_GAZETTEER = '/home/dgraziotin/Projects/dycapo/gazetteer.tab'
+
+# Geocoder results are cached in this SQLite file, shared by all the
+# processes, for GEOCODER_CACHE_TTL seconds. At most GEOCODER_CACHE_SIZE
+# results are kept. Points are looked up rounded to GEOCODER_CACHE_PRECISION
+# decimal places (4 are about 11 meters), by the cache and when coalescing
+# concurrent lookups. '' disables the cache.
+GEOCODER_CACHE = '/home/dgraziotin/Projects/dycapo/geocoder.sqlite'
+GEOCODER_CACHE_TTL = 30 * 24 * 3600
+GEOCODER_CACHE_SIZE = 100000
+GEOCODER_CACHE_PRECISION = 4
+
+# Retrieve the address of the Locations given with just a GeoRSS point in the
+# background, with GEOCODER_WORKERS threads per process, instead of while
+# saving them. Failed lookups are retried GEOCODER_RETRIES times, the first
+# after GEOCODER_RETRY_DELAY seconds, doubling the delay each time. Run
+# manage.py backfilladdresses periodically, e.g. from cron, to complete the
+# Locations left pending by a restart or by the retries running out.
+GEOCODER_DEFERRED = True
+GEOCODER_WORKERS = 2
+GEOCODER_RETRIES = 5
+GEOCODER_RETRY_DELAY = 60
+
 MEDIA_ADMIN = '/usr/local/lib/python2.7/dist-packages/django/contrib/admin/media'
 TEMPLATE_DIR = '/home/dgraziotin/Projects/dycapo/templates/'
 MEDIA_ROOT = '/home/dgraziotin/Projects/dycapo/media/'
@@ -0,0 +1,92 @@
+#! /usr/bin/env python
+"""
+   Copyright 2010 Daniel Graziotin <daniel.graziotin@acm.org>
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+"""
+Times the parsing of the Google geocoder responses in fixtures/google by
+Google.parse_xml() and Google.parse_json(), against just decoding the whole
+page with minidom or simplejson.loads(), as geopy did before reading the
+placemarks. The fixtures reproduce the responses of the Google Maps API v2
+for a point in Bolzano. Run it from the tests folder:
+
+python benchmark_google_parsing.py [number of runs]
+"""
+import os
+import sys
+import timeit
+import urllib
+import xml.dom.minidom
+from StringIO import StringIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+import simplejson
+from geopy.geocoders.google import Google
+from geopy import util
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'fixtures', 'google')
+
+# fixture, exactly_one, reverse
+CASES = [('geocode', True, False),
+         ('reverse', True, True),
+         ('geocode_many', True, True),
+         ('geocode_many', False, False)]
+
+class Headers(object):
+    def getplist(self):
+        return ['charset=UTF-8']
+
+def get_page(body):
+    return urllib.addinfourl(StringIO(body), Headers(),
+                             'http://maps.google.com/maps/geo')
+
+def decode_xml(page):
+    return xml.dom.minidom.parseString(util.decode_page(page)) \
+        .getElementsByTagName('Placemark')
+
+def decode_json(page):
+    return simplejson.loads(util.decode_page(page)).get('Placemark', [])
+
+def best_time(function, number):
+    return min(timeit.repeat(function, number=number, repeat=3)) / number
+
+def main(number=2000):
+    geocoder = Google()
+    print '%-32s %6s %12s %12s' % ('response', 'bytes', 'decode (us)',
+                                   'parse (us)')
+    for name, exactly_one, reverse in CASES:
+        for extension, decode, parse in (('kml', decode_xml,
+                                          geocoder.parse_xml),
+                                         ('json', decode_json,
+                                          geocoder.parse_json)):
+            body = open(os.path.join(FIXTURES, name + '.' + extension),
+                        'rb').read()
+            def run():
+                result = parse(get_page(body), exactly_one, reverse)
+                if not exactly_one:
+                    result = list(result)
+                return result
+            label = '%s.%s %s' % (name, extension,
+                                  exactly_one and 'first' or 'all')
+            if exactly_one and not reverse:
+                label += ', checked'
+            print '%-32s %6d %12.1f %12.1f' % (
+                label, len(body),
+                best_time(lambda: decode(get_page(body)), number) * 1e6,
+                best_time(run, number) * 1e6)
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
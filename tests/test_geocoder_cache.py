@@ -0,0 +1,183 @@
+"""
+   Copyright 2010 Daniel Graziotin <daniel.graziotin@acm.org>
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+"""
+Tests of the SQLite cache of the geocoders, on a temporary database file
+and with a fake geocoder. They need neither Dycapo nor a network
+connection.
+"""
+import os
+import sys
+import time
+import shutil
+import sqlite3
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+from geopy.geocoders.base import Geocoder
+from geopy.geocoders.cache import CachedGeocoder
+
+class CountingGeocoder(Geocoder):
+    """
+    Answers with the query and the number of calls made so far.
+    """
+
+    def __init__(self):
+        self.calls = 0
+
+    def geocode(self, string, exactly_one=True):
+        self.calls += 1
+        return (u"%s #%d" % (string, self.calls), (46.5, 11.35))
+
+    def reverse(self, point, exactly_one=True):
+        self.calls += 1
+        result = (u"Bolzano #%d" % self.calls, tuple(point))
+        if exactly_one:
+            return result
+        return iter([result])
+
+
+class TestCachedGeocoder():
+    def setup_method(self, method):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'geocoder.sqlite')
+        self.geocoder = CountingGeocoder()
+
+    def teardown_method(self, method):
+        shutil.rmtree(self.directory)
+
+    def get_cache(self, **kwargs):
+        return CachedGeocoder(self.geocoder, self.path, **kwargs)
+
+    def get_used(self):
+        connection = sqlite3.connect(self.path)
+        try:
+            return connection.execute(
+                "SELECT used FROM geocodes").fetchall()[0][0]
+        finally:
+            connection.close()
+
+    def test_hits_and_misses(self):
+        cache = self.get_cache()
+        assert cache.geocode('Bolzano')[0] == u'Bolzano #1'
+        # Same normalized address
+        assert cache.geocode('  bolzano ')[0] == u'Bolzano #1'
+        assert cache.geocode('Trento')[0] == u'Trento #2'
+        assert cache.reverse((46.50001, 11.35))[0] == u'Bolzano #3'
+        # Same point at the precision of the cache
+        assert cache.reverse((46.500012, 11.350004))[0] == u'Bolzano #3'
+        assert cache.reverse((46.5, 11.35), False) == \
+            [(u'Bolzano #4', (46.5, 11.35))]
+        assert (cache.hits, cache.misses, cache.errors) == (2, 4, 0)
+        assert self.geocoder.calls == 4
+        assert len(cache) == 4
+
+    def test_shared_between_instances(self):
+        self.get_cache().geocode('Bolzano')
+        cache = self.get_cache()
+        assert cache.geocode('Bolzano')[0] == u'Bolzano #1'
+        assert cache.hits == 1
+
+    def test_failed_lookups_are_not_cached(self):
+        cache = self.get_cache()
+        self.geocoder.geocode = lambda string, exactly_one: 1 / 0
+        try:
+            cache.geocode('Bolzano')
+        except ZeroDivisionError:
+            pass
+        else:
+            assert False
+        assert len(cache) == 0
+
+    def test_expired_entries_are_refreshed(self):
+        cache = self.get_cache(ttl=0.2)
+        assert cache.geocode('Bolzano')[0] == u'Bolzano #1'
+        assert cache.geocode('Bolzano')[0] == u'Bolzano #1'
+        time.sleep(0.3)
+        assert cache.geocode('Bolzano')[0] == u'Bolzano #2'
+        assert cache.geocode('Bolzano')[0] == u'Bolzano #2'
+        assert len(cache) == 1
+
+    def test_usage_is_flushed_in_batches(self):
+        cache = self.get_cache()
+        cache.FLUSH_EVERY = 3
+        cache.geocode('Bolzano')
+        stored = self.get_used()
+        cache.geocode('Bolzano')
+        cache.geocode('Bolzano')
+        # Two hits: nothing written yet
+        assert self.get_used() == stored
+        assert len(cache.used) == 1
+        cache.geocode('Bolzano')
+        assert cache.used == {}
+        assert self.get_used() > stored
+
+    def test_eviction_keeps_the_recently_used(self):
+        cache = self.get_cache(max_entries=5)
+        cache.EVICT_EVERY = 10
+        cache.geocode('address 0')
+        for i in range(1, 10):
+            cache.geocode('address %d' % i)
+            # address 0 is the most recently used one
+            cache.geocode('address 0')
+        assert len(cache) == 5
+        calls = self.geocoder.calls
+        assert cache.geocode('address 0')[0] == u'address 0 #1'
+        for i in range(6, 10):
+            cache.geocode('address %d' % i)
+        assert self.geocoder.calls == calls
+        cache.geocode('address 1')
+        assert self.geocoder.calls == calls + 1
+
+    def test_eviction_removes_expired_entries(self):
+        cache = self.get_cache(ttl=0.2)
+        cache.EVICT_EVERY = 5
+        for i in range(4):
+            cache.geocode('address %d' % i)
+        time.sleep(0.3)
+        cache.geocode('address 4')
+        assert len(cache) == 1
+
+    def test_locked_database(self):
+        cache = self.get_cache(timeout=0.1)
+        cache.FLUSH_EVERY = 1
+        cache.geocode('Bolzano')
+        # Another process writing for longer than the timeout
+        other = sqlite3.connect(self.path, isolation_level=None)
+        other.execute("BEGIN EXCLUSIVE")
+        other.execute("DELETE FROM geocodes")
+        try:
+            assert cache.geocode('Trento')[0] == u'Trento #2'
+            # Reads still work in WAL mode, writing the usage doesn't
+            assert cache.geocode('Bolzano')[0] == u'Bolzano #1'
+            assert cache.errors == 2
+        finally:
+            other.execute("ROLLBACK")
+            other.close()
+        # Trento wasn't stored
+        assert cache.geocode('Trento')[0] == u'Trento #3'
+        assert cache.geocode('Trento')[0] == u'Trento #3'
+
+    def test_corrupt_database(self):
+        database = open(self.path, 'wb')
+        database.write('This is not a SQLite database.' * 1000)
+        database.close()
+        cache = self.get_cache(timeout=0.1)
+        assert cache.geocode('Bolzano')[0] == u'Bolzano #1'
+        assert cache.geocode('Bolzano')[0] == u'Bolzano #2'
+        assert cache.reverse((46.5, 11.35))[0] == u'Bolzano #3'
+        assert cache.hits == 0
+        assert cache.errors > 0
@@ -0,0 +1,169 @@
+"""
+   Copyright 2010 Daniel Graziotin <daniel.graziotin@acm.org>
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+"""
+Tests of the fallthrough, rate limits and circuit breakers of the geocoder
+chain, with fake geocoders. They need neither Dycapo nor a network
+connection.
+"""
+import os
+import sys
+import time
+import urllib2
+import py
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+from geopy.geocoders.base import Geocoder, GeocoderError
+from geopy.geocoders.chain import GeocoderChain
+
+class FakeGeocoder(Geocoder):
+    """
+    Answers with its name, or raises error if set.
+    """
+
+    def __init__(self, name, error=None):
+        self.name = name
+        self.error = error
+        self.queries = []
+
+    def geocode(self, string, exactly_one=True):
+        self.queries.append(string)
+        if self.error is not None:
+            raise self.error
+        return (self.name, (46.5, 11.35))
+
+
+class FakeReverseGeocoder(FakeGeocoder):
+    def reverse(self, point, exactly_one=True):
+        return self.geocode(point, exactly_one)
+
+
+def timeout():
+    return urllib2.URLError('timed out')
+
+class TestGeocoderChain():
+    def test_first_geocoder_answers(self):
+        first, second = FakeGeocoder('first'), FakeGeocoder('second')
+        chain = GeocoderChain([first, second])
+        assert chain.geocode('Bolzano')[0] == 'first'
+        assert second.queries == []
+
+    def test_errors_fall_through(self):
+        first = FakeGeocoder('first', timeout())
+        second = FakeGeocoder('second', ValueError('no results'))
+        third = FakeGeocoder('third')
+        chain = GeocoderChain([first, second, third])
+        assert chain.geocode('Bolzano')[0] == 'third'
+        stats = dict(chain.stats())
+        assert stats['FakeGeocoder']['calls'] == 1
+        first_stats = chain.providers[0].stats()
+        assert first_stats['errors'] == 1 and first_stats['failures'] == 1
+        second_stats = chain.providers[1].stats()
+        assert second_stats['errors'] == 1 and second_stats['failures'] == 0
+
+    def test_all_errors_raise(self):
+        chain = GeocoderChain([FakeGeocoder('first', timeout()),
+                               FakeGeocoder('second', timeout())])
+        py.test.raises(GeocoderError, chain.geocode, 'Bolzano')
+
+    def test_unsupported_method_is_skipped(self):
+        first = FakeGeocoder('first')
+        second = FakeReverseGeocoder('second')
+        chain = GeocoderChain([first, second], rate=1)
+        assert chain.reverse((46.5, 11.35))[0] == 'second'
+        provider = chain.providers[0]
+        assert provider.stats()['skipped'] == 0
+        # Neither a token nor a breaker trial were taken
+        assert provider.bucket.tokens == 1
+        assert chain.geocode('Bolzano')[0] == 'first'
+
+    def test_not_implemented_falls_through(self):
+        first = FakeGeocoder('first', NotImplementedError())
+        chain = GeocoderChain([first, FakeGeocoder('second')], rate=1)
+        assert chain.geocode('Bolzano')[0] == 'second'
+        assert len(first.queries) == 1
+        # The call made no request: its token is given back
+        assert chain.providers[0].bucket.tokens == 1
+        assert chain.providers[0].stats()['errors'] == 0
+
+    def test_rate_limit_falls_through(self):
+        first, second = FakeGeocoder('first'), FakeGeocoder('second')
+        chain = GeocoderChain([first, second], rate=2)
+        answers = [chain.geocode('Bolzano')[0] for i in range(3)]
+        assert answers == ['first', 'first', 'second']
+        assert chain.providers[0].stats()['skipped'] == 1
+        time.sleep(0.6)
+        assert chain.geocode('Bolzano')[0] == 'first'
+
+    def test_breaker_opens_after_failures(self):
+        first = FakeGeocoder('first', timeout())
+        chain = GeocoderChain([first, FakeGeocoder('second')],
+                              max_failures=2, reset_timeout=60)
+        for i in range(4):
+            assert chain.geocode('Bolzano')[0] == 'second'
+        assert len(first.queries) == 2
+        stats = chain.providers[0].stats()
+        assert stats['open'] and stats['skipped'] == 2
+
+    def test_breaker_half_open_trial_closes(self):
+        first = FakeGeocoder('first', timeout())
+        chain = GeocoderChain([first, FakeGeocoder('second')],
+                              max_failures=1, reset_timeout=0.2)
+        assert chain.geocode('Bolzano')[0] == 'second'
+        assert chain.providers[0].breaker.is_open
+        time.sleep(0.3)
+        first.error = None
+        assert chain.geocode('Bolzano')[0] == 'first'
+        assert not chain.providers[0].breaker.is_open
+        assert chain.geocode('Bolzano')[0] == 'first'
+
+    def test_breaker_half_open_trial_reopens(self):
+        first = FakeGeocoder('first', timeout())
+        chain = GeocoderChain([first, FakeGeocoder('second')],
+                              max_failures=1, reset_timeout=0.2)
+        chain.geocode('Bolzano')
+        time.sleep(0.3)
+        assert chain.geocode('Bolzano')[0] == 'second'
+        assert len(first.queries) == 2
+        assert chain.providers[0].breaker.is_open
+        # Open again for another reset_timeout
+        first.error = None
+        assert chain.geocode('Bolzano')[0] == 'second'
+        assert len(first.queries) == 2
+
+    def test_breaker_half_open_allows_a_single_trial(self):
+        first = FakeGeocoder('first', timeout())
+        chain = GeocoderChain([first, FakeGeocoder('second')],
+                              max_failures=1, reset_timeout=0.2)
+        chain.geocode('Bolzano')
+        time.sleep(0.3)
+        breaker = chain.providers[0].breaker
+        assert breaker.allow()
+        assert not breaker.allow()
+        # A trial which wasn't made lets the next call be the trial
+        breaker.cancelled()
+        first.error = None
+        assert chain.geocode('Bolzano')[0] == 'first'
+        assert not breaker.is_open
+
+    def test_local_geocoders_are_not_rate_limited(self):
+        first = FakeGeocoder('first')
+        first.local = True
+        chain = GeocoderChain([first, FakeGeocoder('second')], rate=1)
+        answers = [chain.geocode('Bolzano')[0] for i in range(20)]
+        assert answers == ['first'] * 20
+        assert chain.providers[0].bucket is None
+        assert chain.providers[1].bucket is not None
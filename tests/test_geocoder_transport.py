@@ -0,0 +1,197 @@
+"""
+   Copyright 2010 Daniel Graziotin <daniel.graziotin@acm.org>
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+"""
+Tests of the HTTP transport of the geocoders against fake servers on
+127.0.0.1. They need neither Dycapo nor a network connection.
+"""
+import os
+import sys
+import time
+import urllib2
+import threading
+import BaseHTTPServer
+import SocketServer
+import py
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+from geopy.geocoders.base import HTTPTransport
+
+class FakeServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0),
+                                           FakeHandler)
+        self.lock = threading.Lock()
+        self.clients = set()
+        self.requests = []
+        self.active = 0
+        self.max_active = 0
+        thread = threading.Thread(target=self.serve_forever)
+        thread.setDaemon(True)
+        thread.start()
+
+    def url(self, path):
+        return 'http://127.0.0.1:%d%s' % (self.server_address[1], path)
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class FakeHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    /ok answers with the method and the body of the request, /slow after
+    half a second, /sleep after two seconds. /redirect redirects to /ok,
+    /loop to itself. /drop answers and closes the connection without
+    telling the client, like a server dropping idle connections.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.handle_request('')
+
+    def do_POST(self):
+        self.handle_request(self.rfile.read(
+            int(self.headers.getheader('content-length', 0))))
+
+    def handle_request(self, data):
+        server = self.server
+        server.lock.acquire()
+        try:
+            server.clients.add(self.client_address)
+            server.requests.append((self.command, self.path))
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        finally:
+            server.lock.release()
+        try:
+            if self.path == '/slow':
+                time.sleep(0.5)
+            elif self.path == '/sleep':
+                time.sleep(2)
+            if self.path == '/redirect':
+                self.send_response(302)
+                self.send_header('Location', '/ok')
+                self.send_body('')
+            elif self.path == '/loop':
+                self.send_response(302)
+                self.send_header('Location', '/loop')
+                self.send_body('')
+            elif self.path == '/missing':
+                self.send_response(404)
+                self.send_body('missing')
+            else:
+                self.send_response(200)
+                self.send_body(self.command + ' ' + data)
+            if self.path == '/drop':
+                self.close_connection = 1
+        finally:
+            server.lock.acquire()
+            try:
+                server.active -= 1
+            finally:
+                server.lock.release()
+
+    def send_body(self, body):
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class TestHTTPTransport():
+    def setup_method(self, method):
+        self.server = FakeServer()
+        self.transport = HTTPTransport(max_per_host=2, timeout=1)
+
+    def teardown_method(self, method):
+        self.transport.close()
+        self.server.stop()
+
+    def test_get_and_post(self):
+        page = self.transport.urlopen(self.server.url('/ok'))
+        assert page.read() == 'GET '
+        assert page.code == 200
+        page = self.transport.urlopen(self.server.url('/ok'), 'q=1')
+        assert page.read() == 'POST q=1'
+
+    def test_connections_are_reused(self):
+        for i in range(5):
+            self.transport.urlopen(self.server.url('/ok')).read()
+        assert len(self.server.requests) == 5
+        assert len(self.server.clients) == 1
+
+    def test_connections_per_host_are_capped(self):
+        errors = []
+        def fetch():
+            try:
+                self.transport.urlopen(self.server.url('/slow')).read()
+            except Exception, e:
+                errors.append(e)
+        threads = [threading.Thread(target=fetch) for i in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert errors == []
+        assert len(self.server.requests) == 6
+        assert self.server.max_active == 2
+        assert len(self.server.clients) == 2
+
+    def test_redirects_are_followed(self):
+        page = self.transport.urlopen(self.server.url('/redirect'), 'q=1')
+        assert page.geturl() == self.server.url('/ok')
+        # Like urllib2, the redirection of a POST is a GET
+        assert page.read() == 'GET '
+        assert self.server.requests == [('POST', '/redirect'), ('GET', '/ok')]
+
+    def test_redirects_are_bounded(self):
+        page = self.transport.urlopen(self.server.url('/loop'))
+        assert page.code == 302
+        assert len(self.server.requests) == HTTPTransport.MAX_REDIRECTS + 1
+
+    def test_error_status_raises_http_error(self):
+        error = py.test.raises(urllib2.HTTPError, self.transport.urlopen,
+                               self.server.url('/missing')).value
+        assert error.code == 404
+        assert error.read() == 'missing'
+
+    def test_timeout_is_not_retried(self):
+        start = time.time()
+        py.test.raises(urllib2.URLError, self.transport.urlopen,
+                       self.server.url('/sleep'))
+        assert time.time() - start < 1.5
+        assert self.server.requests == [('GET', '/sleep')]
+
+    def test_get_is_retried_on_dropped_connection(self):
+        self.transport.urlopen(self.server.url('/drop')).read()
+        time.sleep(0.1)
+        page = self.transport.urlopen(self.server.url('/ok'))
+        assert page.read() == 'GET '
+        assert len(self.server.clients) == 2
+
+    def test_post_is_not_retried_on_dropped_connection(self):
+        self.transport.urlopen(self.server.url('/drop')).read()
+        time.sleep(0.1)
+        py.test.raises(urllib2.URLError, self.transport.urlopen,
+                       self.server.url('/ok'), 'q=1')
+        assert ('POST', '/ok') not in self.server.requests
+        page = self.transport.urlopen(self.server.url('/ok'), 'q=1')
+        assert page.read() == 'POST q=1'
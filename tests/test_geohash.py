@@ -0,0 +1,248 @@
+"""
+   Copyright 2010 Daniel Graziotin <daniel.graziotin@acm.org>
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+"""
+Tests of the geohash encoding, neighbours and covers of circles and boxes,
+comparing covers with the cells of points sampled inside them. They need
+neither Dycapo nor a network connection.
+"""
+import os
+import sys
+import py
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+from geopy.geohash import Geohash, GeohashPoint
+from geopy.distance import great_circle_km
+from geopy import Point
+
+def frange(start, stop, steps):
+    return [start + (stop - start) * i / float(steps)
+            for i in xrange(steps + 1)]
+
+def wrap(longitude):
+    return (longitude + 180) % 360 - 180
+
+def sample_circle(latitude, longitude, radius, steps=60):
+    """
+    Return points of a grid over the bounding box of the circle which lie
+    inside it, with the box widened to all the longitudes near the poles.
+    """
+    lat_delta = radius / 111.195 * 1.01
+    points = []
+    for point_latitude in frange(max(latitude - lat_delta, -90),
+                                 min(latitude + lat_delta, 90), steps):
+        for point_longitude in frange(-180, 180, 4 * steps) + \
+                frange(longitude - lat_delta * 50, longitude + lat_delta * 50,
+                       steps):
+            point_longitude = wrap(point_longitude)
+            if great_circle_km(latitude, longitude, point_latitude,
+                               point_longitude) <= radius:
+                points.append((point_latitude, point_longitude))
+    return points
+
+class TestGeohash():
+    def setup_class(self):
+        self.geohash = Geohash()
+
+    def test_encode_decode(self):
+        assert self.geohash.encode(57.64911, 10.40744,
+                                   precision=11) == 'u4pruydqqvj'
+        point = self.geohash.decode('u4pruydqqvj')
+        assert isinstance(point, GeohashPoint)
+        assert abs(point.latitude - 57.64911) <= point.error[0]
+        assert abs(point.longitude - 10.40744) <= point.error[1]
+        py.test.raises(ValueError, self.geohash.decode, 'u4a')
+
+    def test_decode_point_class(self):
+        point = Geohash(point_class=Point).decode('u0q9')
+        assert type(point) is Point
+        assert Geohash(point_class=Point).bbox('u0q9') == \
+            self.geohash.bbox('u0q9')
+
+    def test_bbox(self):
+        lat_min, lat_max, long_min, long_max = self.geohash.bbox('u0q9')
+        for latitude in frange(lat_min, lat_max, 4)[:-1]:
+            for longitude in frange(long_min, long_max, 4)[:-1]:
+                assert self.geohash.encode(latitude, longitude,
+                                           precision=4) == 'u0q9'
+        assert self.geohash.bbox('') == (-90, 90, -180, 180)
+
+    def test_int_forms(self):
+        for latitude, longitude in ((46.5, 11.35), (-90, -180), (90, 180),
+                                    (0, 0), (-33.9, 151.2)):
+            string = self.geohash.encode(latitude, longitude)
+            value = self.geohash.encode_int(latitude, longitude)
+            assert self.geohash.to_int(string) == value
+            assert self.geohash.from_int(value) == string
+            assert self.geohash.decode_int(value) == \
+                self.geohash.decode(string)
+        assert self.geohash.from_int(0, 3) == '000'
+        assert self.geohash.to_int('zz') == 1023
+        # Integers keep the order of the strings
+        strings = sorted(self.geohash.encode(latitude, longitude)
+                         for latitude in frange(-90, 90, 7)
+                         for longitude in frange(-180, 180, 7))
+        values = [self.geohash.to_int(string) for string in strings]
+        assert values == sorted(values)
+        py.test.raises(ValueError, self.geohash.to_int, 'a')
+
+    def test_adjacent(self):
+        cell = self.geohash.encode(46.5, 11.35, precision=5)
+        lat_min, lat_max, long_min, long_max = self.geohash.bbox(cell)
+        height, width = lat_max - lat_min, long_max - long_min
+        for direction, (lat_step, long_step) in (('n', (1, 0)),
+                                                 ('s', (-1, 0)),
+                                                 ('e', (0, 1)),
+                                                 ('w', (0, -1))):
+            expected = self.geohash.encode(46.5 + lat_step * height,
+                                           11.35 + long_step * width,
+                                           precision=5)
+            assert self.geohash.adjacent(cell, direction) == expected
+
+    def test_neighbors(self):
+        cell = self.geohash.encode(46.5, 11.35, precision=6)
+        neighbors = self.geohash.neighbors(cell)
+        assert len(set(neighbors)) == 8 and cell not in neighbors
+        lat_min, lat_max, long_min, long_max = self.geohash.bbox(cell)
+        height, width = lat_max - lat_min, long_max - long_min
+        latitude, longitude = (lat_min + lat_max) / 2, (long_min + long_max) / 2
+        expected = set(self.geohash.encode(latitude + i * height,
+                                           longitude + j * width, precision=6)
+                       for i in (-1, 0, 1) for j in (-1, 0, 1))
+        assert set(neighbors) | set([cell]) == expected
+
+    def test_neighbors_across_the_antimeridian(self):
+        east = self.geohash.encode(10, 179.99, precision=4)
+        west = self.geohash.encode(10, -179.99, precision=4)
+        assert self.geohash.adjacent(east, 'e') == west
+        assert self.geohash.adjacent(west, 'w') == east
+        assert west in self.geohash.neighbors(east)
+        assert east in self.geohash.neighbors(west)
+        assert len(set(self.geohash.neighbors(east))) == 8
+
+    def test_neighbors_at_the_poles(self):
+        for latitude, direction in ((89.99, 'n'), (-89.99, 's')):
+            cell = self.geohash.encode(latitude, 11.35, precision=4)
+            assert self.geohash.adjacent(cell, direction) is None
+            neighbors = self.geohash.neighbors(cell)
+            assert len(set(neighbors)) == 5
+        # The south west corner of the world: its west neighbours are
+        # across the antimeridian
+        assert sorted(self.geohash.neighbors('0')) == \
+            ['1', '2', '3', 'p', 'r']
+
+    def check_cover(self, latitude, longitude, radius, max_cells=16):
+        cells = self.geohash.cover(latitude, longitude, radius, max_cells)
+        assert cells
+        assert len(cells) == len(set(cells)) <= max_cells
+        precision = len(cells[0])
+        assert set(len(cell) for cell in cells) == set([precision])
+        # Every point of the circle is in one of the cells
+        cover = set(cells)
+        points = sample_circle(latitude, longitude, radius)
+        assert points
+        for point in points:
+            assert self.geohash.encode(precision=precision,
+                                       *point) in cover, point
+        # Every cell touches the circle, up to the spacing of the samples
+        for cell in cells:
+            lat_min, lat_max, long_min, long_max = self.geohash.bbox(cell)
+            spacing = ((lat_max - lat_min) + (long_max - long_min)) / 20 \
+                * 111.195
+            nearest = min(great_circle_km(latitude, longitude,
+                                          cell_latitude, cell_longitude)
+                          for cell_latitude in frange(lat_min, lat_max, 20)
+                          for cell_longitude in frange(long_min, long_max, 20))
+            assert nearest <= radius + spacing, cell
+        return cells
+
+    def test_cover(self):
+        cells = self.check_cover(46.5, 11.35, 1)
+        assert self.geohash.encode(46.5, 11.35, precision=len(cells[0])) \
+            in cells
+        self.check_cover(46.5, 11.35, 0.01)
+        self.check_cover(46.5, 11.35, 100)
+        self.check_cover(46.5, 11.35, 1, max_cells=1)
+
+    def test_cover_drops_cells_outside_the_circle(self):
+        cells = self.geohash.cover(46.5, 11.35, 5, max_cells=64)
+        bbox_cells = self.geohash.cover_bbox(46.455, 46.545, 11.285, 11.415,
+                                             64)
+        assert len(cells) < len(bbox_cells)
+
+    def test_cover_across_the_antimeridian(self):
+        for longitude in (179.99, -179.99, 180):
+            cells = self.check_cover(10, longitude, 5)
+            longitudes = [self.geohash.decode(cell).longitude
+                          for cell in cells]
+            assert min(longitudes) < 0 < max(longitudes)
+
+    def test_cover_at_the_poles(self):
+        for latitude in (89.99, -89.99, 90, -90):
+            self.check_cover(latitude, 11.35, 5)
+        self.check_cover(89.9, 11.35, 20)
+        # A circle around the pole covers all the longitudes
+        cells = self.geohash.cover(90, 0, 50)
+        assert len(cells) > 1
+
+    def check_cover_bbox(self, lat_min, lat_max, long_min, long_max,
+                         max_cells=16):
+        cells = self.geohash.cover_bbox(lat_min, lat_max, long_min, long_max,
+                                        max_cells)
+        assert len(cells) == len(set(cells)) <= max_cells
+        precision = len(cells[0])
+        cover = set(cells)
+        for latitude in frange(max(lat_min, -90), min(lat_max, 90), 20):
+            for longitude in frange(long_min, long_max, 20):
+                assert self.geohash.encode(latitude, wrap(longitude),
+                                           precision=precision) in cover
+        # Every cell overlaps the box
+        for cell in cells:
+            cell_lat_min, cell_lat_max, cell_long_min, cell_long_max = \
+                self.geohash.bbox(cell)
+            assert cell_lat_min <= lat_max and cell_lat_max >= lat_min
+            overlaps = False
+            for turn in (-360, 0, 360):
+                if (cell_long_min + turn <= long_max and
+                    cell_long_max + turn >= long_min):
+                    overlaps = True
+            assert overlaps, cell
+        return cells
+
+    def test_cover_bbox(self):
+        cells = self.check_cover_bbox(46.4, 46.6, 11.2, 11.5)
+        assert len(cells[0]) > 2
+        self.check_cover_bbox(46.4, 46.6, 11.2, 11.5, max_cells=1)
+        self.check_cover_bbox(-10, 10, -10, 10, max_cells=64)
+
+    def test_cover_bbox_across_the_antimeridian(self):
+        for long_min, long_max in ((179.5, 180.5), (-180.5, -179.5),
+                                   (170, 190)):
+            cells = self.check_cover_bbox(-1, 1, long_min, long_max)
+            longitudes = [self.geohash.decode(cell).longitude
+                          for cell in cells]
+            assert min(longitudes) < 0 < max(longitudes)
+
+    def test_cover_bbox_at_the_poles(self):
+        self.check_cover_bbox(89.5, 95, 0, 10)
+        self.check_cover_bbox(-95, -89.5, 0, 10)
+        self.check_cover_bbox(89.5, 90, -180, 180, max_cells=32)
+
+    def test_cover_bbox_of_the_world(self):
+        cells = self.geohash.cover_bbox(-90, 90, -180, 180, 32)
+        assert sorted(cells) == sorted(self.geohash.ENCODE_MAP)
+        assert sorted(self.geohash.cover_bbox(-90, 90, -180, 180, 1)) == \
+            sorted(self.geohash.ENCODE_MAP)
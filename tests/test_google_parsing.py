@@ -0,0 +1,88 @@
+"""
+   Copyright 2010 Daniel Graziotin <daniel.graziotin@acm.org>
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+"""
+Tests of the parsing of the Google geocoder responses in fixtures/google.
+They need neither Dycapo nor a network connection.
+"""
+import os
+import sys
+import urllib
+from StringIO import StringIO
+import py
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+from geopy.geocoders.google import Google
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'fixtures', 'google')
+
+class Headers(object):
+    def getplist(self):
+        return ['charset=UTF-8']
+
+def get_page(name):
+    body = open(os.path.join(FIXTURES, name), 'rb').read()
+    return urllib.addinfourl(StringIO(body), Headers(),
+                             'http://maps.google.com/maps/geo')
+
+class TestGoogleParsing():
+    def setup_class(self):
+        self.geocoder = Google()
+        self.formats = (('kml', self.geocoder.parse_xml),
+                        ('json', self.geocoder.parse_json))
+
+    def test_geocode(self):
+        for extension, parse in self.formats:
+            location, (latitude, longitude) = parse(
+                get_page('geocode.' + extension), True, False)
+            assert location == u'Via Citt\xe0 1, 39100 Bolzano BZ, Italia'
+            assert (latitude, longitude) == (46.49, 11.35)
+
+    def test_geocode_ambiguous_raises(self):
+        for extension, parse in self.formats:
+            py.test.raises(ValueError, parse,
+                           get_page('geocode_many.' + extension), True, False)
+
+    def test_geocode_all(self):
+        for extension, parse in self.formats:
+            places = list(parse(get_page('geocode_many.' + extension),
+                                False, False))
+            assert len(places) == 10
+            assert places[9][0].startswith(u'Via Citt\xe0 10,')
+
+    def test_reverse_takes_the_first(self):
+        for name in ('reverse.', 'geocode_many.'):
+            for extension, parse in self.formats:
+                location, point = parse(get_page(name + extension),
+                                        True, True)
+                assert location.startswith(u'Via Citt\xe0 1,')
+
+    def test_json_locality(self):
+        # geocode.json is decoded at once, reverse.json walked
+        for name in ('geocode.json', 'reverse.json'):
+            result = self.geocoder.parse_json(get_page(name), True, True)
+            assert result.locality == 'Bolzano'
+            assert result.administrative == 'Trentino-Alto Adige'
+
+    def test_empty(self):
+        for extension, parse in self.formats:
+            py.test.raises(ValueError, parse,
+                           get_page('empty.' + extension), True, False)
+            py.test.raises(IndexError, parse,
+                           get_page('empty.' + extension), True, True)
+            assert list(parse(get_page('empty.' + extension),
+                              False, False)) == []
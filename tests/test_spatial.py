@@ -0,0 +1,128 @@
+"""
+   Copyright 2010 Daniel Graziotin <daniel.graziotin@acm.org>
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+"""
+Tests of the index of the routes of active Trips used by the matching
+algorithm. They need neither Dycapo nor a database.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+from server.spatial import CorridorIndex, distance_to_polyline
+
+# North from Bolzano, about 11 KMs per segment
+ROUTE = [(46.0, 11.0), (46.1, 11.0), (46.2, 11.0)]
+
+class TestDistanceToPolyline():
+    def test_point_on_a_segment(self):
+        distance, along = distance_to_polyline(46.05, 11.0, ROUTE)
+        assert distance < 1e-6
+        assert abs(along - 0.5) < 1e-3
+
+    def test_point_beside_a_segment(self):
+        distance, along = distance_to_polyline(46.15, 11.01, ROUTE)
+        assert abs(distance - 0.77) < 0.01
+        assert abs(along - 1.5) < 1e-2
+
+    def test_point_beyond_the_ends(self):
+        distance, along = distance_to_polyline(45.99, 11.0, ROUTE)
+        assert abs(distance - 1.11) < 0.01 and along == 0.0
+        distance, along = distance_to_polyline(46.21, 11.0, ROUTE)
+        assert abs(distance - 1.11) < 0.01 and along == 2.0
+
+    def test_single_point(self):
+        distance, along = distance_to_polyline(46.01, 11.0, ROUTE[:1])
+        assert abs(distance - 1.11) < 0.01 and along == 0.0
+
+
+class TestCorridorIndex():
+    def setup_method(self, method):
+        self.index = CorridorIndex()
+        self.index.set_route(1, ROUTE)
+
+    def test_search_within_the_width(self):
+        found = self.index.search(46.1, 11.003, 0.3)
+        assert found.keys() == [1]
+        distance, along = found[1]
+        assert abs(distance - 0.23) < 0.01
+        assert abs(along - 1.0) < 1e-3
+
+    def test_search_outside_the_width(self):
+        assert self.index.search(46.1, 11.005, 0.3) == {}
+        assert self.index.search(46.3, 11.0, 0.3) == {}
+        assert self.index.search(46.1, 11.005, 0.5).keys() == [1]
+
+    def test_search_long_segments(self):
+        # The middle of a segment crossing many cells of the grid
+        self.index.set_route(2, [(45.0, 10.0), (46.0, 12.0)])
+        assert self.index.search(45.5, 11.0, 0.3).keys() == [2]
+
+    def test_advance_before_the_origin(self):
+        # Waiting next to the origin: it is still to be driven
+        self.index.advance(1, 46.0, 11.001, 0.3)
+        assert self.index.get_route(1) == [(46.0, 11.001)] + ROUTE
+        assert self.index.search(46.0, 11.0, 0.3).keys() == [1]
+
+    def test_advance_at_the_origin(self):
+        self.index.advance(1, 46.0, 11.0, 0.3)
+        assert self.index.get_route(1) == ROUTE
+
+    def test_advance_far_from_the_route(self):
+        # e.g. a position left from an earlier Trip
+        self.index.advance(1, 46.0, 11.1, 0.3)
+        assert self.index.get_route(1) == ROUTE
+        self.index.advance(1, 46.0, 11.1)
+        assert self.index.get_route(1) == [(46.0, 11.1)] + ROUTE
+        assert self.index.search(46.0, 11.0, 0.3).keys() == [1]
+
+    def test_advance_along_the_route(self):
+        self.index.advance(1, 46.05, 11.001, 0.3)
+        assert self.index.get_route(1) == [(46.05, 11.001)] + ROUTE[1:]
+        assert self.index.search(46.0, 11.0, 0.3) == {}
+        assert self.index.search(46.1, 11.0, 0.3).keys() == [1]
+        self.index.advance(1, 46.15, 11.0, 0.3)
+        assert self.index.get_route(1) == [(46.15, 11.0), ROUTE[2]]
+        assert self.index.search(46.1, 11.0, 0.3) == {}
+
+    def test_advance_past_the_route(self):
+        self.index.advance(1, 46.25, 11.0)
+        assert self.index.get_route(1) == [(46.25, 11.0), ROUTE[2]]
+        self.index.advance(1, 46.2, 11.0)
+        assert self.index.get_route(1) == [ROUTE[2]]
+        assert self.index.search(46.2, 11.0, 0.3).keys() == [1]
+
+    def test_advance_unknown_route(self):
+        self.index.advance(2, 46.0, 11.0)
+        assert self.index.get_route(2) is None
+        assert len(self.index) == 1
+
+    def test_remove(self):
+        self.index.remove(1)
+        assert self.index.get_route(1) is None
+        assert self.index.search(46.1, 11.0, 0.3) == {}
+        assert self.index.buckets == {}
+        # An advance after the Trip finished doesn't bring it back
+        self.index.advance(1, 46.1, 11.0)
+        assert self.index.get_route(1) is None
+        self.index.remove(1)
+
+    def test_load(self):
+        self.index.load([(2, ROUTE[1:]), (3, [(45.0, 10.0), (45.1, 10.0)])])
+        assert self.index.get_route(1) is None
+        assert self.index.search(46.15, 11.0, 0.3).keys() == [2]
+        assert self.index.search(45.05, 10.0, 0.3).keys() == [3]
+        assert not self.index.is_stale(60)
@@ -0,0 +1,65 @@
+"""
+   Copyright 2010 Daniel Graziotin <daniel.graziotin@acm.org>
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+"""
+Tests of the Tracks of the positions of Persons used by the matching
+algorithm. They need neither Dycapo nor a database.
+"""
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'server'))
+from tracking import Track
+
+def north_of(km):
+    return 46.0 + km / 111.195, 11.0
+
+class TestTrack():
+    def setup_method(self, method):
+        # Driving north at 1 KM per minute
+        self.track = Track()
+        for minute in range(4):
+            self.track.update(minute, *(north_of(minute) + (minute * 60,)))
+
+    def test_heading_and_speed(self):
+        east, north = self.track.heading
+        assert abs(east) < 1e-9 and abs(north - 0.875) < 1e-6
+        assert 50 < self.track.get_speed() <= 60
+        assert self.track.get_last_location_id() == 3
+
+    def test_proximity_factor(self):
+        ahead = self.track.get_proximity_factor(*north_of(10))
+        behind = self.track.get_proximity_factor(*north_of(-10))
+        assert abs(ahead - 3) < 1e-6
+        assert abs(behind + 3) < 1e-6
+
+    def test_late_positions_are_ignored(self):
+        heading, speed = self.track.heading, self.track.get_speed()
+        self.track.update(10, *(north_of(1.5) + (90,)))
+        self.track.update(11, *(north_of(0.5) + (30,)))
+        assert self.track.heading == heading
+        assert self.track.get_speed() == speed
+        assert self.track.get_last_location_id() == 3
+        assert self.track.get_proximity_factor(*north_of(10)) > 0
+
+    def test_positions_at_the_same_time(self):
+        track = Track()
+        for i in range(5):
+            track.update(i, *(north_of(-i * 0.1) + (60,)))
+        assert track.heading[1] < 0
+        assert track.get_speed() == 0
+        assert track.get_proximity_factor(*north_of(1)) < 0